@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
-from typing import List
+from typing import List, Optional
+from backend.config import config
 from backend.database.models import ScrapedPage, CrawlQueue
 from backend.database.client import DatabaseClient
+from backend.scraper.frontier import enqueue_seeds
 
 router = APIRouter()
 db = DatabaseClient()
@@ -10,16 +12,22 @@ db = DatabaseClient()
 async def add_to_crawl_queue(urls: List[str]):
     """Add URLs to crawl queue"""
     try:
-        for url in urls:
-            await db.add_to_queue(url)
-        return {"message": f"Added {len(urls)} URLs to queue"}
+        counts = await enqueue_seeds(db, ({'url': url} for url in urls), batch_size=max(len(urls), 1))
+        return {"message": f"Added {counts['added']} URLs to queue", **counts}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search")
-async def search_content(query: str, limit: int = 10):
+async def search_content(query: str, limit: int = 10, mode: str = config.search.default_mode,
+                         nprobe: Optional[int] = None):
     """Search crawled content"""
+    if mode not in ("keyword", "vector", "hybrid"):
+        raise HTTPException(status_code=400, detail=f"Unknown search mode: {mode}")
     try:
+        if mode == "vector":
+            return await db.vector_search(query, limit, nprobe)
+        if mode == "hybrid":
+            return await db.hybrid_search(query, limit, nprobe)
         results = await db.search_content(query, limit)
         return results
     except Exception as e:
@@ -1,26 +1,120 @@
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import List, Optional
 
 @dataclass
 class CrawlerConfig:
     user_agent: str = "ScrapAI-Bot/1.0"
     request_delay: int = 2
+    respect_robots: bool = True
+    robots_ttl: float = 86400.0  # seconds to cache a fetched (or missing) robots.txt
+    robots_error_ttl: float = 300.0  # seconds before retrying robots.txt after 5xx/errors; its URLs are deferred meanwhile
+    robots_cache_size: int = 10000  # hosts kept in the robots.txt cache
+    robots_timeout: float = 10.0
+    max_crawl_delay: float = 60.0  # cap on robots.txt Crawl-delay
+    max_concurrent: int = 5
+    per_host_concurrency: int = 2
+    parse_workers: int = 0  # processes for HTML extraction, 0 = one per CPU
+    parse_queue_size: int = 32  # fetched pages waiting to be parsed before fetchers pause
+    extractor: str = "auto"  # "auto", "selectolax", "lxml" or "bs4"
+    max_body_size: int = 10 * 1024 * 1024  # decompressed bytes; larger responses are aborted
+    charset_sniff_bytes: int = 4096  # bytes searched for <meta charset> when the header has none
+    near_duplicate_distance: int = 3  # SimHash bits apart that count as a near-duplicate (max 3), 0 disables
+    near_duplicate_min_words: int = 50  # shorter pages get no fingerprint
+    follow_links: bool = True
+    max_depth: int = 2  # link hops followed from a seed URL
+    same_domain_only: bool = True  # only follow links to the page's own host (www. ignored)
+    allowed_domains: List[str] = field(default_factory=list)  # if set, links must be on these domains
+    max_links_per_page: int = 200
+    frontier_path: str = "./frontier.bloom"  # persisted seen-URL filter
+    frontier_capacity: int = 1000000  # URLs before the filter adds a layer
+    frontier_error_rate: float = 0.001
+    frontier_save_interval: float = 60.0
+    enqueue_batch_size: int = 5000  # URLs per INSERT when uploading seed files
+    recrawl_min_age: float = 3600.0  # seconds after a URL finished before resubmitting it re-queues it
+    claim_batch_size: int = 20
+    idle_poll_interval: float = 5.0
+    stats_interval: float = 30.0
+    lease_seconds: int = 300
+    max_retries: int = 3
 
 @dataclass
 class EmbeddingConfig:
     model: str = "all-MiniLM-L6-v2"
-    batch_size: int = 32
+    batch_size: int = 32  # chunks per batch until the first batches have been timed
+    # Batches are cut from length-sorted chunks and sized so that one forward
+    # pass takes about target_batch_seconds
+    target_batch_seconds: float = 0.5
+    min_batch_size: int = 8
+    max_batch_size: int = 256
+    prefetch_size: int = 1024  # chunks fetched per query
+    idle_poll_interval: float = 5.0
+    max_idle_interval: float = 60.0
+    stats_interval: float = 30.0
 
 @dataclass
 class ChunkingConfig:
+    # "sentences" sizes chunks in characters; "tokens" packs sentences up to a
+    # token budget with the embedding model's tokenizer and stores the token ids
+    mode: str = "sentences"
     chunk_size: int = 500
     overlap: int = 50
+    max_tokens: int = 256  # including special tokens; all-MiniLM-L6-v2 truncates at 256
+    token_overlap: int = 32
+    # False stores only each chunk's offsets; its text is sliced from
+    # pages.content when read, so overlapping text isn't stored twice
+    store_text: bool = True
     batch_size: int = 32
+    # Backlog mode: python -m workers.chunking_worker --backlog
+    workers: int = 0  # chunking processes; 0 = one per CPU
+    backlog_batch_size: int = 1024  # pages fetched per query
+    pages_per_task: int = 32  # pages handed to a process (and written) at once
+    idle_poll_interval: float = 5.0  # doubles while idle, up to max_idle_interval
+    max_idle_interval: float = 60.0
+    stats_interval: float = 30.0
 
 @dataclass
 class DatabaseConfig:
     url: str = "sqlite:///./scrapai.db"
     echo: bool = False
+    # Use the asyncio engine (aiosqlite / asyncpg) instead of a thread pool
+    async_driver: bool = False
+    max_concurrency: int = 16
+    # Threads running blocking DB calls; the pool is sized to match
+    executor_workers: int = 8
+    pool_size: int = 0  # 0 = executor_workers
+    max_overflow: int = 2
+    pool_timeout: float = 30.0
+    # SQLite storage profile, applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: int = 5000  # ms
+    sqlite_cache_size: int = -65536  # negative = KiB, so 64 MiB
+    sqlite_mmap_size: int = 268435456  # 256 MiB
+    sqlite_temp_store: str = "MEMORY"
+
+@dataclass
+class SearchConfig:
+    default_mode: str = "keyword"
+    refresh_interval: float = 5.0
+    refresh_batch_size: int = 5000
+    vector_backend: str = "memory"  # "memory", "mmap" or "ivf"
+    index_dir: str = "./vector_index"
+    compact_min_segments: int = 8
+    compact_interval: float = 60.0
+    # A segment is merged with the newer ones after it only once it is at most
+    # this many times their combined size, so big segments are rarely rewritten
+    compact_size_ratio: float = 4.0
+    # The embedding worker appends a segment once this many rows are pending,
+    # or append_interval seconds after the last append, or when it goes idle
+    append_min_rows: int = 4096
+    append_interval: float = 30.0
+    ivf_nlist: int = 0  # 0 picks 4 * sqrt(n) at training time
+    ivf_nprobe: int = 8
+    ivf_min_train_size: int = 10000
+    hybrid_candidates: int = 50
+    hybrid_rrf_k: int = 60
+    hybrid_keyword_weight: float = 1.0
+    hybrid_vector_weight: float = 1.0
 
 @dataclass 
 class Config:
@@ -28,5 +122,6 @@ class Config:
     embedding: EmbeddingConfig = field(default_factory=EmbeddingConfig)
     chunking: ChunkingConfig = field(default_factory=ChunkingConfig)
     database: DatabaseConfig = field(default_factory=DatabaseConfig)
+    search: SearchConfig = field(default_factory=SearchConfig)
 
 config = Config()
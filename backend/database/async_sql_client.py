@@ -0,0 +1,72 @@
+"""
+Native asyncio database client for ScrapAI
+Runs SQLClient's query code on SQLAlchemy's asyncio engine (aiosqlite / asyncpg)
+so database calls no longer hop through a thread pool
+"""
+
+import asyncio
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import greenlet_spawn
+
+from backend.config import config
+from .sql_client import SQLClient, apply_sqlite_pragmas, engine_options
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+}
+
+
+def to_async_url(database_url: str) -> str:
+    """Swap a sync driver URL for its asyncio driver"""
+    scheme, rest = database_url.split('://', 1)
+    dialect = scheme.split('+', 1)[0]
+    return f"{ASYNC_DRIVERS.get(dialect, scheme)}://{rest}"
+
+
+class AsyncSQLClient(SQLClient):
+    """
+    Same surface as SQLClient, backed by an async driver
+
+    Every *_sync query method is reused unchanged: it runs inside
+    greenlet_spawn against the async engine's sync facade, which is the
+    mechanism AsyncSession itself uses, so driver I/O is awaited on the
+    event loop. A semaphore bounds concurrent database work.
+    """
+
+    def __init__(self, database_url: Optional[str] = None):
+        database_url = database_url or config.database.url
+        # The plain engine is kept for create_tables and migrations at startup
+        super().__init__(database_url)
+
+        async_url = to_async_url(database_url)
+        options = engine_options(async_url)
+        if 'pool_size' in options:
+            # aiosqlite would otherwise default to NullPool and reconnect per call
+            options['poolclass'] = AsyncAdaptedQueuePool
+            options['pool_size'] = config.database.max_concurrency
+        self.async_engine = create_async_engine(async_url, **options)
+        apply_sqlite_pragmas(self.async_engine.sync_engine)
+        self.SessionLocal = sessionmaker(
+            autocommit=False, autoflush=False, bind=self.async_engine.sync_engine
+        )
+        self._semaphore = asyncio.Semaphore(config.database.max_concurrency)
+
+    def _create_executor(self) -> None:
+        """Queries run on the event loop, so no thread pool is needed"""
+        return None
+
+    async def _run(self, func, *args):
+        """Run a query method on the event loop via the async driver"""
+        async with self._semaphore:
+            return await greenlet_spawn(func, *args)
+
+    async def close(self):
+        """Close the async driver's connections (aiosqlite runs a thread per connection)"""
+        await self.async_engine.dispose()
+        self.engine.dispose()
@@ -1,29 +1,87 @@
+from typing import Optional
+from backend.config import config
 from .sql_client import SQLClient
 
 class DatabaseClient:
     def __init__(self):
-        self.client = SQLClient()
+        if config.database.async_driver:
+            from .async_sql_client import AsyncSQLClient
+            self.client = AsyncSQLClient()
+        else:
+            self.client = SQLClient()
         # Create tables on initialization
         self.client.create_tables()
+        self._search_engine = None
+        
+    async def close(self):
+        """Release the database client's connections and threads; call once on shutdown"""
+        await self.client.close()
         
     async def add_to_queue(self, url: str):
         return await self.client.add_to_queue(url)
         
+    async def add_to_queue_bulk(self, items: list, refresh: bool = False) -> int:
+        """Queue many {'url', 'depth', 'priority'} items, skipping URLs already queued (refresh re-queues finished ones)"""
+        return await self.client.add_to_queue_bulk(items, refresh)
+        
+    async def get_queue_urls_after(self, last_id: int = 0, limit: int = 10000) -> list:
+        return await self.client.get_queue_urls_after(last_id, limit)
+        
     async def get_next_queue_item(self):
         return await self.client.get_next_queue_item()
         
     async def save_page(self, data: dict):
         return await self.client.save_page(data)
         
+    async def find_near_duplicate(self, fingerprint: Optional[int], exclude_page_id: Optional[int] = None):
+        return await self.client.find_near_duplicate(fingerprint, exclude_page_id)
+        
+    async def get_page_validators(self, url: str) -> Optional[dict]:
+        return await self.client.get_page_validators(url)
+        
+    async def mark_page_unchanged(self, page_id: int, etag: Optional[str] = None,
+                                  last_modified: Optional[str] = None) -> bool:
+        return await self.client.mark_page_unchanged(page_id, etag, last_modified)
+        
     async def is_duplicate(self, content_hash: str):
         return await self.client.is_duplicate(content_hash)
         
-    async def mark_queue_processed(self, queue_id: str, status: str):
-        return await self.client.mark_queue_processed(int(queue_id), status)
+    async def claim_batch(self, n: int, worker_id: str, lease_seconds: int = 300) -> list:
+        """Atomically claim up to n queued items under a lease"""
+        return await self.client.claim_batch(n, worker_id, lease_seconds)
+        
+    async def renew_lease(self, queue_ids: list, worker_id: str, lease_seconds: int = 300) -> int:
+        return await self.client.renew_lease(queue_ids, worker_id, lease_seconds)
+        
+    async def mark_queue_processed(self, queue_id: str, status: str, worker_id: Optional[str] = None):
+        return await self.client.mark_queue_processed(int(queue_id), status, worker_id)
+        
+    async def defer_queue_item(self, queue_id: str, delay: float, worker_id: str) -> bool:
+        """Requeue a held item to be claimed again after delay seconds"""
+        return await self.client.defer_queue_item(int(queue_id), delay, worker_id)
         
     async def search_content(self, query: str, limit: int = 10):
         return await self.client.search_content(query, limit)
         
+    def _get_search_engine(self):
+        if self._search_engine is None:
+            # Imported lazily so NumPy is only needed once vector search is used
+            from backend.search.vector_index import SemanticSearchEngine
+            self._search_engine = SemanticSearchEngine(self.client)
+        return self._search_engine
+        
+    async def vector_search(self, query: str, limit: int = 10, nprobe: Optional[int] = None):
+        """Rank chunks by cosine similarity to the embedded query"""
+        return await self._get_search_engine().search(query, limit, nprobe)
+        
+    async def hybrid_search(self, query: str, limit: int = 10, nprobe: Optional[int] = None):
+        """Fuse keyword and vector rankings of chunks"""
+        from backend.search.hybrid import hybrid_search
+        return await hybrid_search(self.client, self._get_search_engine(), query, limit, nprobe)
+        
+    async def search_chunks(self, query: str, limit: int = 10):
+        return await self.client.search_chunks(query, limit)
+        
     async def get_pages(self, skip: int = 0, limit: int = 50):
         return await self.client.get_pages(skip, limit)
         
@@ -37,20 +95,37 @@ class DatabaseClient:
     async def save_embedding(self, chunk_id: int, vector: list) -> int:
         return await self.client.save_embedding(chunk_id, vector)
         
+    async def save_chunks_for_pages(self, pages: list) -> int:
+        """Save the chunks of many pages in one transaction"""
+        return await self.client.save_chunks_for_pages(pages)
+        
+    async def save_embeddings_bulk(self, embeddings: list) -> list:
+        """Save (chunk_id, vector) pairs in one transaction"""
+        return await self.client.save_embeddings_bulk(embeddings)
+        
     async def get_pages_without_embeddings(self, limit: int = 10) -> list:
         return await self.client.get_pages_without_embeddings(limit)
         
     async def mark_embedding_generated(self, page_id: int) -> bool:
         return await self.client.mark_embedding_generated(page_id)
         
-    async def get_pages_needing_chunking(self, limit: int = 10) -> list:
-        """Get pages that have content but no chunks"""
-        return await self.client.get_pages_needing_chunking(limit)
+    async def get_pages_needing_chunking(self, limit: int = 10, after_id: int = 0) -> list:
+        """Get pages that have content but no chunks, in id order after after_id"""
+        return await self.client.get_pages_needing_chunking(limit, after_id)
         
-    async def get_chunks_without_embeddings(self, limit: int = 10) -> list:
-        """Get chunks that don't have embeddings yet"""
-        return await self.client.get_chunks_without_embeddings(limit)
+    async def get_chunks_without_embeddings(self, limit: int = 10, after_id: int = 0) -> list:
+        """Get chunks that don't have embeddings yet, in id order after after_id"""
+        return await self.client.get_chunks_without_embeddings(limit, after_id)
         
     async def mark_chunk_embedded(self, chunk_id: int) -> bool:
         """Mark chunk as having embeddings generated"""
         return await self.client.mark_chunk_embedded(chunk_id)
+        
+    async def get_embeddings_after(self, last_id: int = 0, limit: int = 5000) -> list:
+        return await self.client.get_embeddings_after(last_id, limit)
+        
+    async def get_deleted_chunks_after(self, last_id: int = 0, limit: int = 5000) -> list:
+        return await self.client.get_deleted_chunks_after(last_id, limit)
+        
+    async def get_chunks_by_ids(self, chunk_ids: list) -> list:
+        return await self.client.get_chunks_by_ids(chunk_ids)
@@ -0,0 +1,264 @@
+"""
+Schema and data migrations for ScrapAI
+Schema migrations run from SQLClient.create_tables; the data migrations (binary
+vectors, SimHash backfill) run once against an existing database with:
+python -m backend.database.migrations
+"""
+
+import logging
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from backend.database.vector_codec import encode_vector, decode_vector
+from backend.utils.simhash import fingerprint_bands, simhash, to_signed64
+
+logger = logging.getLogger(__name__)
+
+
+# Text of a chunks row: its chunk_text, or the slice of its page's content
+# that its offsets point at when only offsets are stored
+CHUNK_TEXT_SQL = (
+    "CASE WHEN {row}.chunk_text != '' THEN {row}.chunk_text "
+    "ELSE (SELECT substr(pages.content, {row}.start_char + 1, {row}.end_char - {row}.start_char) "
+    "FROM pages WHERE pages.id = {row}.page_id) END"
+)
+
+# Views FTS reads indexed text back from
+CONTENT_VIEWS = {
+    'chunk_texts': f"SELECT id, page_id, {CHUNK_TEXT_SQL.format(row='chunks')} AS chunk_text FROM chunks",
+}
+
+FULLTEXT_TABLES = {
+    # fts table: (source table, content table or view, {indexed column: its value for a source row})
+    'pages_fts': ('pages', 'pages', {'title': '{row}.title', 'content': '{row}.content'}),
+    'chunks_fts': ('chunks', 'chunk_texts', {'chunk_text': CHUNK_TEXT_SQL}),
+}
+
+
+def add_missing_columns(engine: Engine, metadata) -> List[str]:
+    """ALTER TABLE ... ADD COLUMN for model columns missing from existing tables"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Added columns: {', '.join(added)}")
+    return added
+
+
+def create_missing_indexes(engine: Engine, metadata) -> None:
+    """create_all skips indexes on tables that already exist, so add them here"""
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
+def dedupe_queue_urls(engine: Engine) -> int:
+    """Remove repeated crawl_queue URLs (keeping the oldest) so the unique index can be built"""
+    indexes = {index['name'] for index in inspect(engine).get_indexes('crawl_queue')}
+    if 'idx_queue_url_unique' in indexes:
+        return 0
+    with engine.begin() as conn:
+        removed = conn.execute(text(
+            "DELETE FROM crawl_queue WHERE id NOT IN (SELECT MIN(id) FROM crawl_queue GROUP BY url)"
+        )).rowcount
+    if removed:
+        logger.info(f"Removed {removed} duplicate crawl queue URLs")
+    return removed
+
+
+def use_autoincrement_ids(engine: Engine, table) -> bool:
+    """
+    Rebuild a SQLite table created without AUTOINCREMENT so deleting its
+    newest rows can't hand their ids out again
+    """
+    if engine.dialect.name != 'sqlite' or table.name not in inspect(engine).get_table_names():
+        return False
+    with engine.begin() as conn:
+        sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table.name}
+        ).scalar()
+        if 'AUTOINCREMENT' in sql.upper():
+            return False
+        old_name = f"{table.name}_old"
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+        # Indexes moved with the old table and their names are needed again
+        index_names = conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"
+        ), {'name': old_name}).scalars().all()
+        for index_name in index_names:
+            conn.execute(text(f"DROP INDEX {index_name}"))
+        table.create(bind=conn)
+        columns = ', '.join(f'"{column.name}"' for column in table.columns)
+        conn.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}"))
+        conn.execute(text(f"DROP TABLE {old_name}"))
+    logger.info(f"Rebuilt {table.name} with AUTOINCREMENT ids")
+    return True
+
+
+def drop_unused_indexes(engine: Engine) -> None:
+    """Drop indexes that only cost writes (LIKE '%...%' can never use them)"""
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS idx_chunk_text"))
+
+
+def create_fulltext_index(engine: Engine) -> bool:
+    """
+    Create FTS5 tables over page titles/content and chunk text, kept in sync by triggers
+
+    Returns False when the database is not SQLite or lacks FTS5, in which case
+    keyword search falls back to LIKE scans.
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    with engine.begin() as conn:
+        schema = {row[0]: row[1] or '' for row in conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger', 'view')"
+        ))}
+        for view, query in CONTENT_VIEWS.items():
+            if view not in schema:
+                conn.execute(text(f"CREATE VIEW {view} AS {query}"))
+
+        for fts_table, (source, content, columns) in FULLTEXT_TABLES.items():
+            # Rebuild an index created over a different content table, e.g.
+            # chunks_fts from before offsets-only chunks read through chunk_texts
+            if fts_table in schema and f"content='{content}'" not in schema[fts_table]:
+                conn.execute(text(f"DROP TABLE {fts_table}"))
+                for suffix in ('ai', 'ad', 'au'):
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}"))
+                    schema.pop(f"{fts_table}_{suffix}", None)
+                schema.pop(fts_table)
+
+            column_list = ', '.join(columns)
+            new_values = ', '.join(value.format(row='new') for value in columns.values())
+            old_values = ', '.join(value.format(row='old') for value in columns.values())
+            delete_old = (
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+                f"VALUES ('delete', old.id, {old_values});"
+            )
+            insert_new = f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});"
+
+            if fts_table not in schema:
+                try:
+                    conn.execute(text(
+                        f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+                        f"{column_list}, content='{content}', content_rowid='id', "
+                        f"tokenize='porter unicode61')"
+                    ))
+                except Exception as e:
+                    logger.warning(f"FTS5 unavailable, keyword search will use LIKE scans: {e}")
+                    return False
+                # Index rows that existed before the table was created
+                conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+            triggers = {
+                f'{fts_table}_ai': f"AFTER INSERT ON {source} BEGIN {insert_new} END",
+                f'{fts_table}_ad': f"AFTER DELETE ON {source} BEGIN {delete_old} END",
+                f'{fts_table}_au': f"AFTER UPDATE OF {column_list} ON {source} BEGIN {delete_old} {insert_new} END",
+            }
+            for name, body in triggers.items():
+                if name not in schema:
+                    conn.execute(text(f"CREATE TRIGGER {name} {body}"))
+    return True
+
+
+def migrate_embedding_vectors(engine: Engine, batch_size: int = 1000) -> int:
+    """Rewrite JSON-encoded embedding vectors as binary float32 blobs"""
+    if engine.dialect.name == 'postgresql':
+        column = next(c for c in inspect(engine).get_columns('embeddings') if c['name'] == 'vector')
+        if column['type'].python_type is str:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "ALTER TABLE embeddings ALTER COLUMN vector TYPE BYTEA "
+                    "USING convert_to(vector, 'UTF8')"
+                ))
+
+    migrated = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, vector FROM embeddings WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                value = row.vector
+                if isinstance(value, memoryview):
+                    value = value.tobytes()
+                if isinstance(value, bytes) and value.startswith(b'['):
+                    value = value.decode('utf-8')
+                if isinstance(value, str):
+                    updates.append({'id': row.id, 'vector': encode_vector(decode_vector(value))})
+
+            if updates:
+                conn.execute(text("UPDATE embeddings SET vector = :vector WHERE id = :id"), updates)
+                migrated += len(updates)
+            last_id = rows[-1].id
+
+    logger.info(f"Migrated {migrated} embedding vectors to binary format")
+    return migrated
+
+
+def backfill_page_simhashes(engine: Engine, min_words: int = 50, batch_size: int = 1000) -> int:
+    """Fingerprint pages stored before near-duplicate detection and index their bands"""
+    filled = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, content FROM pages WHERE id > :last_id AND simhash IS NULL "
+                "ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+            if not rows:
+                break
+
+            bands = []
+            for row in rows:
+                fingerprint = simhash(row.content or '', min_words=min_words)
+                if fingerprint is None:
+                    continue
+                conn.execute(text("UPDATE pages SET simhash = :simhash WHERE id = :id"),
+                             {'id': row.id, 'simhash': to_signed64(fingerprint)})
+                bands += [
+                    {'page_id': row.id, 'band': band, 'value': value}
+                    for band, value in enumerate(fingerprint_bands(fingerprint))
+                ]
+                filled += 1
+
+            if bands:
+                conn.execute(text(
+                    "INSERT INTO page_simhash_bands (page_id, band, value) VALUES (:page_id, :band, :value)"
+                ), bands)
+            last_id = rows[-1].id
+
+    logger.info(f"Fingerprinted {filled} existing pages")
+    return filled
+
+
+if __name__ == "__main__":
+    import sys
+    from sqlalchemy import create_engine
+    from backend.config import config
+
+    logging.basicConfig(level=logging.INFO)
+    database_url = sys.argv[1] if len(sys.argv) > 1 else config.database.url
+    engine = create_engine(database_url)
+    migrate_embedding_vectors(engine)
+    backfill_page_simhashes(engine, config.crawler.near_duplicate_min_words)
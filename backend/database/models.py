@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Index, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, Index, ForeignKey, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -16,6 +16,11 @@ class Page(Base):
     language = Column(String)
     crawl_time = Column(DateTime, default=func.now())
     embedded = Column(Boolean, default=False)
+    # HTTP validators and raw-body hash from the last fetch, for conditional re-crawls
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    body_hash = Column(String, nullable=True)
+    simhash = Column(BigInteger, nullable=True)  # signed 64-bit SimHash of the content, see utils/simhash
     
     # Relationships
     chunks = relationship("Chunk", back_populates="page", cascade="all, delete-orphan")
@@ -34,6 +39,10 @@ class Chunk(Base):
     page_id = Column(Integer, ForeignKey('pages.id'), index=True, nullable=False)
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
+    token_ids = Column(LargeBinary, nullable=True)  # Model token ids from TokenChunker, see vector_codec
+    # Position in pages.content; chunk_text is '' when only the offsets are stored
+    start_char = Column(Integer, nullable=True)
+    end_char = Column(Integer, nullable=True)
     
     # Relationships
     page = relationship("Page", back_populates="chunks")
@@ -42,7 +51,6 @@ class Chunk(Base):
     # Indexes
     __table_args__ = (
         Index('idx_page_id', 'page_id'),
-        Index('idx_chunk_text', 'chunk_text'),
     )
 
 class Embedding(Base):
@@ -50,7 +58,7 @@ class Embedding(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     chunk_id = Column(Integer, ForeignKey('chunks.id'), index=True, nullable=False)
-    vector = Column(Text)  # Storing as JSON for simplicity
+    vector = Column(LargeBinary)  # Header + raw float32 values, see vector_codec
     created_at = Column(DateTime, default=func.now())
     
     # Relationships
@@ -59,8 +67,18 @@ class Embedding(Base):
     # Indexes
     __table_args__ = (
         Index('idx_chunk_id', 'chunk_id'),
+        # Vector indexes read new rows by id; a reused id would be skipped
+        {'sqlite_autoincrement': True},
     )
 
+class DeletedChunk(Base):
+    """Log of embedded chunks deleted on re-crawl, read by vector indexes to drop them"""
+    __tablename__ = 'deleted_chunks'
+    
+    id = Column(Integer, primary_key=True)
+    chunk_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=func.now())
+
 class CrawlQueue(Base):
     __tablename__ = 'crawl_queue'
     
@@ -71,12 +89,32 @@ class CrawlQueue(Base):
     priority = Column(Integer, default=0)
     scheduled_at = Column(DateTime, default=func.now())
     processed_at = Column(DateTime, nullable=True)
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    depth = Column(Integer, default=0)  # link hops from a seed URL
     
     # Indexes
     __table_args__ = (
         Index('idx_url_status', 'url', 'status'),
         Index('idx_status', 'status'),
         Index('idx_priority', 'priority'),
+        Index('idx_status_lease', 'status', 'lease_expires_at'),
+        Index('idx_status_priority_scheduled', 'status', 'priority', 'scheduled_at'),
+        Index('idx_queue_url_unique', 'url', unique=True),
+    )
+
+class SimhashBand(Base):
+    __tablename__ = 'page_simhash_bands'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    page_id = Column(Integer, nullable=False)
+    band = Column(Integer, nullable=False)  # which 16-bit slice of the fingerprint
+    value = Column(Integer, nullable=False)
+    
+    # Indexes
+    __table_args__ = (
+        Index('idx_simhash_band_value', 'band', 'value'),
+        Index('idx_simhash_page_id', 'page_id'),
     )
 
 class SearchLog(Base):
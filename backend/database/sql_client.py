@@ -1,13 +1,23 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Index
+from sqlalchemy import case, create_engine, event, insert, or_, select, update, Column, Integer, BigInteger, String, Text, DateTime, Boolean, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.sql import func
-from typing import List, Optional, Dict, Any
+from sqlalchemy.sql import func, text
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 import asyncio
-import json
-from datetime import datetime
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-from .models import Base, Page, Chunk, Embedding, CrawlQueue, SearchLog
+from backend.config import config
+from backend.utils.simhash import (
+    MAX_INDEXED_DISTANCE, fingerprint_bands, from_signed64, hamming_distance, simhash, to_signed64
+)
+from .models import Base, Page, Chunk, Embedding, CrawlQueue, SearchLog, SimhashBand
+from .vector_codec import encode_vector, decode_vector, encode_token_ids, decode_token_ids
+from .migrations import (
+    add_missing_columns, create_fulltext_index, create_missing_indexes, dedupe_queue_urls, drop_unused_indexes,
+    use_autoincrement_ids
+)
 
 Base = declarative_base()
 
@@ -22,6 +32,11 @@ class Page(Base):
     language = Column(String)
     crawl_time = Column(DateTime, default=func.now())
     embedded = Column(Boolean, default=False)
+    # HTTP validators and raw-body hash from the last fetch, for conditional re-crawls
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    body_hash = Column(String, nullable=True)
+    simhash = Column(BigInteger, nullable=True)  # signed 64-bit SimHash of the content, see utils/simhash
     
     # Indexes for better search performance
     __table_args__ = (
@@ -37,11 +52,14 @@ class Chunk(Base):
     page_id = Column(Integer, index=True, nullable=False)
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
+    token_ids = Column(LargeBinary, nullable=True)  # Model token ids from TokenChunker, see vector_codec
+    # Position in pages.content; chunk_text is '' when only the offsets are stored
+    start_char = Column(Integer, nullable=True)
+    end_char = Column(Integer, nullable=True)
     
     # Indexes
     __table_args__ = (
         Index('idx_page_id', 'page_id'),
-        Index('idx_chunk_text', 'chunk_text'),
     )
 
 class Embedding(Base):
@@ -49,14 +67,24 @@ class Embedding(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     chunk_id = Column(Integer, index=True, nullable=False)
-    vector = Column(Text)  # Storing as JSON for simplicity, could use specialized vector types
+    vector = Column(LargeBinary)  # Header + raw float32 values, see vector_codec
     created_at = Column(DateTime, default=func.now())
     
     # Indexes
     __table_args__ = (
         Index('idx_chunk_id', 'chunk_id'),
+        # Vector indexes read new rows by id; a reused id would be skipped
+        {'sqlite_autoincrement': True},
     )
 
+class DeletedChunk(Base):
+    """Log of embedded chunks deleted on re-crawl, read by vector indexes to drop them"""
+    __tablename__ = 'deleted_chunks'
+    
+    id = Column(Integer, primary_key=True)
+    chunk_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=func.now())
+
 class CrawlQueue(Base):
     __tablename__ = 'crawl_queue'
     
@@ -67,12 +95,32 @@ class CrawlQueue(Base):
     priority = Column(Integer, default=0)
     scheduled_at = Column(DateTime, default=func.now())
     processed_at = Column(DateTime, nullable=True)
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    depth = Column(Integer, default=0)  # link hops from a seed URL
     
     # Indexes
     __table_args__ = (
         Index('idx_url_status', 'url', 'status'),
         Index('idx_status', 'status'),
         Index('idx_priority', 'priority'),
+        Index('idx_status_lease', 'status', 'lease_expires_at'),
+        Index('idx_status_priority_scheduled', 'status', 'priority', 'scheduled_at'),
+        Index('idx_queue_url_unique', 'url', unique=True),
+    )
+
+class SimhashBand(Base):
+    __tablename__ = 'page_simhash_bands'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    page_id = Column(Integer, nullable=False)
+    band = Column(Integer, nullable=False)  # which 16-bit slice of the fingerprint
+    value = Column(Integer, nullable=False)
+    
+    # Indexes
+    __table_args__ = (
+        Index('idx_simhash_band_value', 'band', 'value'),
+        Index('idx_simhash_page_id', 'page_id'),
     )
 
 class SearchLog(Base):
@@ -89,14 +137,94 @@ class SearchLog(Base):
         Index('idx_timestamp', 'timestamp'),
     )
 
+def chunk_text_column():
+    """
+    Chunk text, sliced from the page content when only offsets are stored
+    (same as CHUNK_TEXT_SQL in migrations); the query must join Page
+    """
+    return case(
+        (Chunk.chunk_text != '', Chunk.chunk_text),
+        else_=func.substr(Page.content, Chunk.start_char + 1, Chunk.end_char - Chunk.start_char)
+    ).label('chunk_text')
+
+def sqlite_pragmas() -> List[str]:
+    """PRAGMA statements for the configured SQLite storage profile"""
+    db_config = config.database
+    return [
+        f"journal_mode={db_config.sqlite_journal_mode}",
+        f"synchronous={db_config.sqlite_synchronous}",
+        f"busy_timeout={int(db_config.sqlite_busy_timeout)}",
+        f"cache_size={int(db_config.sqlite_cache_size)}",
+        f"mmap_size={int(db_config.sqlite_mmap_size)}",
+        f"temp_store={db_config.sqlite_temp_store}",
+    ]
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    """Pool settings sized to the executor so threads never queue for a connection"""
+    db_config = config.database
+    options: Dict[str, Any] = {'echo': db_config.echo}
+    if database_url.startswith('sqlite') and ':memory:' in database_url:
+        return options
+    options.update(
+        pool_size=db_config.pool_size or db_config.executor_workers,
+        max_overflow=db_config.max_overflow,
+        pool_timeout=db_config.pool_timeout,
+        pool_pre_ping=not database_url.startswith('sqlite'),
+    )
+    if database_url.startswith('sqlite'):
+        # Connections are handed between executor threads by the pool
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': db_config.sqlite_busy_timeout / 1000,
+        }
+    return options
+
+def apply_sqlite_pragmas(engine) -> None:
+    """Run the storage profile PRAGMAs on every new DBAPI connection"""
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas():
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
 class SQLClient:
-    def __init__(self, database_url: str = "sqlite:///./scrapai.db"):
-        self.engine = create_engine(database_url, echo=False)
+    def __init__(self, database_url: Optional[str] = None):
+        database_url = database_url or config.database.url
+        self.engine = create_engine(database_url, **engine_options(database_url))
+        apply_sqlite_pragmas(self.engine)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.executor = self._create_executor()
+        self.fts_enabled = False
+    
+    def _create_executor(self) -> Optional[ThreadPoolExecutor]:
+        return ThreadPoolExecutor(
+            max_workers=config.database.executor_workers,
+            thread_name_prefix='scrapai-db'
+        )
+    
+    async def _run(self, func, *args):
+        """Run a blocking DB call on the client's own executor"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+    
+    async def close(self):
+        """Wait for running DB calls, then release the executor threads and pooled connections"""
+        self.executor.shutdown(wait=True)
+        self.engine.dispose()
         
     def create_tables(self):
         """Create all tables"""
+        add_missing_columns(self.engine, Base.metadata)
+        use_autoincrement_ids(self.engine, Embedding.__table__)
         Base.metadata.create_all(bind=self.engine)
+        dedupe_queue_urls(self.engine)
+        create_missing_indexes(self.engine, Base.metadata)
+        drop_unused_indexes(self.engine)
+        self.fts_enabled = create_fulltext_index(self.engine)
     
     def get_db(self) -> Session:
         """Get database session"""
@@ -108,80 +236,276 @@ class SQLClient:
     
     async def add_to_queue(self, url: str) -> bool:
         """Add URL to crawl queue"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._add_to_queue_sync, url)
+        return await self._run(self._add_to_queue_sync, url)
     
     def _add_to_queue_sync(self, url: str) -> bool:
+        try:
+            return self._add_to_queue_bulk_sync([{'url': url}]) == 1
+        except Exception:
+            return False
+    
+    async def add_to_queue_bulk(self, items: List[Dict[str, Any]], refresh: bool = False) -> int:
+        """
+        Queue many URLs in one statement, skipping ones already queued
+
+        Each item needs a 'url' and may carry 'depth' and 'priority'. With
+        refresh, URLs that finished (completed, failed, unchanged, ...) more
+        than crawler.recrawl_min_age seconds ago are queued again so they get
+        re-crawled. Returns the number of URLs added or re-queued; database
+        errors are raised so callers can't mistake lost URLs for duplicates.
+        """
+        return await self._run(self._add_to_queue_bulk_sync, items, refresh)
+    
+    def _recrawlable(self, now: datetime):
+        """Queue rows a resubmitted URL may reset to 'queued'"""
+        # Plain comparisons: an expanding IN can't be bound per row by executemany
+        return (CrawlQueue.status != 'queued') & (CrawlQueue.status != 'processing') & or_(
+            CrawlQueue.processed_at.is_(None),
+            CrawlQueue.processed_at <= now - timedelta(seconds=config.crawler.recrawl_min_age)
+        )
+    
+    def _add_to_queue_bulk_sync(self, items: List[Dict[str, Any]], refresh: bool = False) -> int:
+        rows_by_url = {}
+        for item in items:
+            rows_by_url.setdefault(item['url'], {
+                'url': item['url'], 'depth': item.get('depth', 0), 'priority': item.get('priority', 0)
+            })
+        rows = list(rows_by_url.values())
+        if not rows:
+            return 0
+        
+        now = datetime.utcnow()
+        requeue = {
+            'status': 'queued',
+            'retries': 0,
+            'worker_id': None,
+            'lease_expires_at': None,
+            'scheduled_at': now
+        }
+        dialect = self.engine.dialect.name
         db = self.SessionLocal()
         try:
-            # Check if URL already exists in queue
-            existing = db.query(CrawlQueue).filter(CrawlQueue.url == url).first()
-            if existing:
-                return False
-            
-            queue_item = CrawlQueue(url=url)
-            db.add(queue_item)
+            if dialect in ('sqlite', 'postgresql'):
+                if dialect == 'sqlite':
+                    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert as dialect_insert
+                # The unique index on url makes duplicates a no-op instead of a SELECT per URL
+                stmt = dialect_insert(CrawlQueue)
+                if refresh:
+                    # Finished rows are reset in place; RETURNING skips conflicts the WHERE leaves alone
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['url'],
+                        set_=dict(requeue, depth=stmt.excluded.depth, priority=stmt.excluded.priority),
+                        where=self._recrawlable(now)
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=['url'])
+                added = len(db.execute(stmt.returning(CrawlQueue.id), rows).fetchall())
+            else:
+                existing = {
+                    row.url for row in
+                    db.query(CrawlQueue.url).filter(CrawlQueue.url.in_([row['url'] for row in rows]))
+                }
+                new_rows = [row for row in rows if row['url'] not in existing]
+                if new_rows:
+                    db.execute(insert(CrawlQueue), new_rows)
+                added = len(new_rows)
+                if refresh and existing:
+                    added += db.execute(
+                        update(CrawlQueue)
+                        .where(CrawlQueue.url.in_(existing), self._recrawlable(now))
+                        .values(**requeue)
+                        .execution_options(synchronize_session=False)
+                    ).rowcount
             db.commit()
-            return True
+            return added
         except Exception:
             db.rollback()
-            return False
+            raise
+        finally:
+            db.close()
+    
+    async def get_queue_urls_after(self, last_id: int = 0, limit: int = 10000) -> List[Dict[str, Any]]:
+        """Page through every queued URL in id order (used to warm the frontier's seen-set)"""
+        return await self._run(self._get_queue_urls_after_sync, last_id, limit)
+    
+    def _get_queue_urls_after_sync(self, last_id: int, limit: int) -> List[Dict[str, Any]]:
+        db = self.SessionLocal()
+        try:
+            rows = db.query(CrawlQueue.id, CrawlQueue.url)\
+                .filter(CrawlQueue.id > last_id)\
+                .order_by(CrawlQueue.id)\
+                .limit(limit)\
+                .all()
+            return [{'id': row.id, 'url': row.url} for row in rows]
         finally:
             db.close()
     
     async def get_next_queue_item(self) -> Optional[Dict[str, Any]]:
         """Get next item from queue for processing"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._get_next_queue_item_sync)
+        items = await self.claim_batch(1, 'default', config.crawler.lease_seconds)
+        return items[0] if items else None
+    
+    async def claim_batch(self, n: int, worker_id: str, lease_seconds: int = 300) -> List[Dict[str, Any]]:
+        """Atomically claim up to n queued items for worker_id under a lease"""
+        return await self._run(self._claim_batch_sync, n, worker_id, lease_seconds)
     
-    def _get_next_queue_item_sync(self) -> Optional[Dict[str, Any]]:
+    def _claim_batch_sync(self, n: int, worker_id: str, lease_seconds: int = 300) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
         db = self.SessionLocal()
         try:
-            # Get oldest queued item
-            queue_item = db.query(CrawlQueue).filter(
-                CrawlQueue.status == 'queued'
-            ).order_by(CrawlQueue.scheduled_at.asc()).first()
+            self._release_expired_leases(db, now)
             
-            if queue_item:
-                # Mark as processing
-                queue_item.status = 'processing'
-                db.commit()
-                
-                return {
-                    'id': queue_item.id,
-                    'url': queue_item.url,
-                    'status': queue_item.status,
-                    'retries': queue_item.retries
+            # Highest priority first, oldest first within a priority; skip deferred items
+            candidates = select(CrawlQueue.id)\
+                .where(CrawlQueue.status == 'queued')\
+                .where(or_(CrawlQueue.scheduled_at <= now, CrawlQueue.scheduled_at.is_(None)))\
+                .order_by(CrawlQueue.priority.desc(), CrawlQueue.scheduled_at.asc())\
+                .limit(n)
+            if self.engine.dialect.name == 'postgresql':
+                # Concurrent claimers skip rows another transaction is claiming
+                candidates = candidates.with_for_update(skip_locked=True)
+            
+            # A single UPDATE ... RETURNING, so no two workers can claim the same row
+            rows = db.execute(
+                update(CrawlQueue)
+                .where(CrawlQueue.id.in_(candidates.scalar_subquery()))
+                .where(CrawlQueue.status == 'queued')
+                .values(
+                    status='processing',
+                    worker_id=worker_id,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds)
+                )
+                .returning(CrawlQueue.id, CrawlQueue.url, CrawlQueue.retries, CrawlQueue.priority, CrawlQueue.depth)
+                .execution_options(synchronize_session=False)
+            ).fetchall()
+            db.commit()
+            
+            return [
+                {
+                    'id': row.id,
+                    'url': row.url,
+                    'status': 'processing',
+                    'retries': row.retries,
+                    'priority': row.priority,
+                    'depth': row.depth or 0
                 }
-            return None
+                for row in rows
+            ]
         except Exception:
             db.rollback()
-            return None
+            return []
+        finally:
+            db.close()
+    
+    def _release_expired_leases(self, db: Session, now: datetime) -> None:
+        """Requeue items whose lease ran out, failing those out of retries"""
+        expired = (CrawlQueue.status == 'processing') & or_(
+            CrawlQueue.lease_expires_at < now,
+            CrawlQueue.lease_expires_at.is_(None)  # claimed before leases existed
+        )
+        db.execute(
+            update(CrawlQueue)
+            .where(expired, CrawlQueue.retries >= config.crawler.max_retries)
+            .values(status='failed', worker_id=None, lease_expires_at=None, processed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            update(CrawlQueue)
+            .where(expired)
+            .values(
+                status='queued',
+                worker_id=None,
+                lease_expires_at=None,
+                retries=CrawlQueue.retries + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+    
+    async def renew_lease(self, queue_ids: List[int], worker_id: str, lease_seconds: int = 300) -> int:
+        """Extend the lease on items still held by worker_id"""
+        return await self._run(self._renew_lease_sync, queue_ids, worker_id, lease_seconds)
+    
+    def _renew_lease_sync(self, queue_ids: List[int], worker_id: str, lease_seconds: int = 300) -> int:
+        if not queue_ids:
+            return 0
+        db = self.SessionLocal()
+        try:
+            result = db.execute(
+                update(CrawlQueue)
+                .where(CrawlQueue.id.in_(queue_ids))
+                .where(CrawlQueue.status == 'processing')
+                .where(CrawlQueue.worker_id == worker_id)
+                .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return result.rowcount
+        except Exception:
+            db.rollback()
+            return 0
         finally:
             db.close()
     
     async def save_page(self, data: dict) -> int:
-        """Save page content to database"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._save_page_sync, data)
+        """
+        Save page content to database
+
+        A URL that is already stored is updated in place; if its content
+        changed, its chunks and embeddings are dropped so it is re-processed.
+        """
+        return await self._run(self._save_page_sync, data)
     
     def _save_page_sync(self, data: dict) -> int:
         db = self.SessionLocal()
         try:
-            # Check for duplicate content hash
-            if 'hash' in data and data['hash']:
-                existing = db.query(Page).filter(Page.content_hash == data['hash']).first()
-                if existing:
+            content_hash = data.get('hash', '')
+            page = db.query(Page).filter(Page.url == data.get('url', '')).first()
+            
+            # Check for duplicate content hash on another page
+            if content_hash:
+                existing = db.query(Page).filter(Page.content_hash == content_hash).first()
+                if existing and (page is None or existing.id != page.id):
                     return existing.id
             
-            page = Page(
-                url=data.get('url', ''),
-                title=data.get('title', ''),
-                content=data.get('content', ''),
-                content_hash=data.get('hash', ''),
-                language=data.get('language', 'en')
-            )
-            db.add(page)
+            content_changed = page is None or page.content_hash != content_hash
+            fingerprint = None
+            if content_changed:
+                fingerprint = data['simhash'] if 'simhash' in data else simhash(
+                    data.get('content', ''), min_words=config.crawler.near_duplicate_min_words
+                )
+                # Near-duplicates of another page are dropped like exact ones
+                near_duplicate = self._find_near_duplicate(db, fingerprint, page.id if page else None)
+                if near_duplicate:
+                    return near_duplicate
+            
+            if page is None:
+                page = Page(
+                    url=data.get('url', ''),
+                    title=data.get('title', ''),
+                    content=data.get('content', ''),
+                    content_hash=content_hash,
+                    language=data.get('language', 'en')
+                )
+                db.add(page)
+            elif page.content_hash != content_hash:
+                # Before the content changes: the FTS delete trigger rebuilds
+                # offsets-only chunk text from the old content
+                self._delete_page_chunks(db, page.id)
+                page.title = data.get('title', '')
+                page.content = data.get('content', '')
+                page.content_hash = content_hash
+                page.embedded = False
+            
+            page.etag = data.get('etag')
+            page.last_modified = data.get('last_modified')
+            page.body_hash = data.get('body_hash')
+            page.crawl_time = datetime.utcnow()
+            if content_changed:
+                page.simhash = to_signed64(fingerprint) if fingerprint is not None else None
+                db.flush()
+                self._index_simhash(db, page.id, fingerprint)
             db.commit()
             db.refresh(page)
             return page.id
@@ -191,10 +515,102 @@ class SQLClient:
         finally:
             db.close()
     
+    @staticmethod
+    def _delete_page_chunks(db: Session, page_id: int) -> None:
+        chunk_ids = select(Chunk.id).where(Chunk.page_id == page_id)
+        # Vector indexes hold these chunks too; they read the log and drop them
+        db.execute(insert(DeletedChunk).from_select(
+            ['chunk_id'], select(Embedding.chunk_id).where(Embedding.chunk_id.in_(chunk_ids))
+        ))
+        db.query(Embedding).filter(Embedding.chunk_id.in_(chunk_ids)).delete(synchronize_session=False)
+        db.query(Chunk).filter(Chunk.page_id == page_id).delete(synchronize_session=False)
+    
+    @staticmethod
+    def _index_simhash(db: Session, page_id: int, fingerprint: Optional[int]) -> None:
+        db.query(SimhashBand).filter(SimhashBand.page_id == page_id).delete(synchronize_session=False)
+        if fingerprint is not None:
+            db.execute(insert(SimhashBand), [
+                {'page_id': page_id, 'band': band, 'value': value}
+                for band, value in enumerate(fingerprint_bands(fingerprint))
+            ])
+    
+    @staticmethod
+    def _find_near_duplicate(db: Session, fingerprint: Optional[int],
+                             exclude_page_id: Optional[int] = None) -> Optional[int]:
+        """Id of a stored page within near_duplicate_distance bits of fingerprint"""
+        max_distance = min(config.crawler.near_duplicate_distance, MAX_INDEXED_DISTANCE)
+        if fingerprint is None or max_distance <= 0:
+            return None
+        
+        # Candidates share at least one band exactly; verify the full distance
+        band_filters = [
+            (SimhashBand.band == band) & (SimhashBand.value == value)
+            for band, value in enumerate(fingerprint_bands(fingerprint))
+        ]
+        candidates = db.query(Page.id, Page.simhash)\
+            .join(SimhashBand, SimhashBand.page_id == Page.id)\
+            .filter(or_(*band_filters))\
+            .distinct()\
+            .all()
+        for candidate in candidates:
+            if candidate.id == exclude_page_id or candidate.simhash is None:
+                continue
+            if hamming_distance(fingerprint, from_signed64(candidate.simhash)) <= max_distance:
+                return candidate.id
+        return None
+    
+    async def find_near_duplicate(self, fingerprint: Optional[int],
+                                  exclude_page_id: Optional[int] = None) -> Optional[int]:
+        """Id of a page whose content is a near-duplicate (by SimHash) of fingerprint, if any"""
+        return await self._run(self._find_near_duplicate_sync, fingerprint, exclude_page_id)
+    
+    def _find_near_duplicate_sync(self, fingerprint: Optional[int], exclude_page_id: Optional[int]) -> Optional[int]:
+        db = self.SessionLocal()
+        try:
+            return self._find_near_duplicate(db, fingerprint, exclude_page_id)
+        finally:
+            db.close()
+    
+    async def get_page_validators(self, url: str) -> Optional[Dict[str, Any]]:
+        """ETag, Last-Modified and raw-body hash stored for a URL, or None if never saved"""
+        return await self._run(self._get_page_validators_sync, url)
+    
+    def _get_page_validators_sync(self, url: str) -> Optional[Dict[str, Any]]:
+        db = self.SessionLocal()
+        try:
+            row = db.query(Page.id, Page.etag, Page.last_modified, Page.body_hash)\
+                .filter(Page.url == url).first()
+            if row is None:
+                return None
+            return {'id': row.id, 'etag': row.etag, 'last_modified': row.last_modified, 'body_hash': row.body_hash}
+        finally:
+            db.close()
+    
+    async def mark_page_unchanged(self, page_id: int, etag: Optional[str] = None,
+                                  last_modified: Optional[str] = None) -> bool:
+        """Record a re-crawl that found the page unchanged, keeping any newer validators"""
+        return await self._run(self._mark_page_unchanged_sync, page_id, etag, last_modified)
+    
+    def _mark_page_unchanged_sync(self, page_id: int, etag: Optional[str], last_modified: Optional[str]) -> bool:
+        db = self.SessionLocal()
+        try:
+            values = {'crawl_time': datetime.utcnow()}
+            if etag:
+                values['etag'] = etag
+            if last_modified:
+                values['last_modified'] = last_modified
+            updated = db.execute(update(Page).where(Page.id == page_id).values(**values)).rowcount
+            db.commit()
+            return updated > 0
+        except Exception:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+    
     async def is_duplicate(self, content_hash: str) -> bool:
         """Check if content already exists"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._is_duplicate_sync, content_hash)
+        return await self._run(self._is_duplicate_sync, content_hash)
     
     def _is_duplicate_sync(self, content_hash: str) -> bool:
         db = self.SessionLocal()
@@ -203,18 +619,22 @@ class SQLClient:
         finally:
             db.close()
     
-    async def mark_queue_processed(self, queue_id: int, status: str) -> bool:
-        """Mark queue item as processed"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._mark_queue_processed_sync, queue_id, status)
+    async def mark_queue_processed(self, queue_id: int, status: str, worker_id: Optional[str] = None) -> bool:
+        """Mark queue item as processed; with worker_id, only if that worker still holds it"""
+        return await self._run(self._mark_queue_processed_sync, queue_id, status, worker_id)
     
-    def _mark_queue_processed_sync(self, queue_id: int, status: str) -> bool:
+    def _mark_queue_processed_sync(self, queue_id: int, status: str, worker_id: Optional[str] = None) -> bool:
         db = self.SessionLocal()
         try:
-            queue_item = db.query(CrawlQueue).filter(CrawlQueue.id == queue_id).first()
+            query = db.query(CrawlQueue).filter(CrawlQueue.id == queue_id)
+            if worker_id is not None:
+                # A worker whose lease expired must not overwrite the new owner's result
+                query = query.filter(CrawlQueue.worker_id == worker_id)
+            queue_item = query.first()
             if queue_item:
                 queue_item.status = status
                 queue_item.processed_at = func.now()
+                queue_item.lease_expires_at = None
                 db.commit()
                 return True
             return False
@@ -224,10 +644,43 @@ class SQLClient:
         finally:
             db.close()
     
+    async def defer_queue_item(self, queue_id: int, delay: float, worker_id: str) -> bool:
+        """
+        Hand an item worker_id holds back to the queue, claimable after delay seconds
+
+        Each deferral uses up a retry; an item out of retries is failed instead.
+        """
+        return await self._run(self._defer_queue_item_sync, queue_id, delay, worker_id)
+    
+    def _defer_queue_item_sync(self, queue_id: int, delay: float, worker_id: str) -> bool:
+        db = self.SessionLocal()
+        try:
+            queue_item = db.query(CrawlQueue)\
+                .filter(CrawlQueue.id == queue_id, CrawlQueue.worker_id == worker_id)\
+                .first()
+            if queue_item is None:
+                return False
+            now = datetime.utcnow()
+            queue_item.worker_id = None
+            queue_item.lease_expires_at = None
+            if (queue_item.retries or 0) >= config.crawler.max_retries:
+                queue_item.status = 'failed'
+                queue_item.processed_at = now
+            else:
+                queue_item.status = 'queued'
+                queue_item.retries = (queue_item.retries or 0) + 1
+                queue_item.scheduled_at = now + timedelta(seconds=delay)
+            db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+    
     async def save_chunk(self, page_id: int, chunk_text: str, chunk_index: int) -> int:
         """Save text chunk associated with a page"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._save_chunk_sync, page_id, chunk_text, chunk_index)
+        return await self._run(self._save_chunk_sync, page_id, chunk_text, chunk_index)
     
     def _save_chunk_sync(self, page_id: int, chunk_text: str, chunk_index: int) -> int:
         db = self.SessionLocal()
@@ -247,19 +700,59 @@ class SQLClient:
         finally:
             db.close()
     
-    async def save_embedding(self, chunk_id: int, vector: List[float]) -> int:
+    async def save_chunks_for_pages(self, pages: List[Dict[str, Any]]) -> int:
+        """
+        Save the chunks of many pages in a single transaction
+
+        Each item has 'page_id' and the chunks' 'starts' and 'ends' offsets in
+        the page content, plus optionally their texts ('chunks') and
+        'token_ids'. Without texts only the offsets are stored and the text
+        is sliced from the page content when read. Returns the number of
+        chunks written, 0 on failure.
+        """
+        return await self._run(self._save_chunks_for_pages_sync, pages)
+    
+    def _save_chunks_for_pages_sync(self, pages: List[Dict[str, Any]]) -> int:
+        rows = []
+        for page in pages:
+            count = len(page['starts'])
+            texts = page.get('chunks') or [''] * count
+            token_ids = page.get('token_ids') or [None] * count
+            rows.extend(
+                {
+                    'page_id': page['page_id'],
+                    'chunk_text': chunk_text,
+                    'chunk_index': i,
+                    'token_ids': encode_token_ids(ids) if ids is not None else None,
+                    'start_char': start,
+                    'end_char': end
+                }
+                for i, (chunk_text, ids, start, end) in enumerate(zip(texts, token_ids, page['starts'], page['ends']))
+            )
+        if not rows:
+            return 0
+        db = self.SessionLocal()
+        try:
+            # No RETURNING needed: one executemany over every page in the batch
+            db.execute(insert(Chunk), rows)
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            return 0
+        finally:
+            db.close()
+    
+    async def save_embedding(self, chunk_id: int, vector) -> int:
         """Save embedding vector for a chunk"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._save_embedding_sync, chunk_id, vector)
+        return await self._run(self._save_embedding_sync, chunk_id, vector)
     
-    def _save_embedding_sync(self, chunk_id: int, vector: List[float]) -> int:
+    def _save_embedding_sync(self, chunk_id: int, vector) -> int:
         db = self.SessionLocal()
         try:
-            # Store vector as JSON string
-            vector_json = json.dumps(vector)
             embedding = Embedding(
                 chunk_id=chunk_id,
-                vector=vector_json
+                vector=encode_vector(vector)
             )
             db.add(embedding)
             db.commit()
@@ -271,10 +764,33 @@ class SQLClient:
         finally:
             db.close()
     
+    async def save_embeddings_bulk(self, embeddings: Sequence[Tuple[int, Any]]) -> List[int]:
+        """Save (chunk_id, vector) pairs in a single transaction, returning ids in order"""
+        return await self._run(self._save_embeddings_bulk_sync, embeddings)
+    
+    def _save_embeddings_bulk_sync(self, embeddings: Sequence[Tuple[int, Any]]) -> List[int]:
+        if not embeddings:
+            return []
+        db = self.SessionLocal()
+        try:
+            embedding_ids = db.scalars(
+                insert(Embedding).returning(Embedding.id, sort_by_parameter_order=True),
+                [
+                    {'chunk_id': chunk_id, 'vector': encode_vector(vector)}
+                    for chunk_id, vector in embeddings
+                ]
+            ).all()
+            db.commit()
+            return list(embedding_ids)
+        except Exception:
+            db.rollback()
+            return []
+        finally:
+            db.close()
+    
     async def get_pages_without_embeddings(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get pages that don't have embeddings yet"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._get_pages_without_embeddings_sync, limit)
+        return await self._run(self._get_pages_without_embeddings_sync, limit)
     
     def _get_pages_without_embeddings_sync(self, limit: int = 10) -> List[Dict[str, Any]]:
         db = self.SessionLocal()
@@ -300,19 +816,20 @@ class SQLClient:
         finally:
             db.close()
             
-    async def get_pages_needing_chunking(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get pages that have content but no chunks"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._get_pages_needing_chunking_sync, limit)
+    async def get_pages_needing_chunking(self, limit: int = 10, after_id: int = 0) -> List[Dict[str, Any]]:
+        """Get pages that have content but no chunks, in id order after after_id"""
+        return await self._run(self._get_pages_needing_chunking_sync, limit, after_id)
     
-    def _get_pages_needing_chunking_sync(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def _get_pages_needing_chunking_sync(self, limit: int = 10, after_id: int = 0) -> List[Dict[str, Any]]:
         db = self.SessionLocal()
         try:
             # Get pages that have content but no chunks
             pages = db.query(Page).outerjoin(Chunk, Page.id == Chunk.page_id)\
+                .filter(Page.id > after_id)\
                 .filter(Page.content.isnot(None))\
                 .filter(Page.content != '')\
                 .filter(Chunk.id.is_(None))\
+                .order_by(Page.id)\
                 .limit(limit)\
                 .all()
             
@@ -329,19 +846,22 @@ class SQLClient:
         finally:
             db.close()
             
-    async def get_chunks_without_embeddings(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get chunks that don't have embeddings yet"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._get_chunks_without_embeddings_sync, limit)
+    async def get_chunks_without_embeddings(self, limit: int = 10, after_id: int = 0) -> List[Dict[str, Any]]:
+        """Get chunks that don't have embeddings yet, in id order after after_id"""
+        return await self._run(self._get_chunks_without_embeddings_sync, limit, after_id)
     
-    def _get_chunks_without_embeddings_sync(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def _get_chunks_without_embeddings_sync(self, limit: int = 10, after_id: int = 0) -> List[Dict[str, Any]]:
         db = self.SessionLocal()
         try:
             # Get chunks that don't have embeddings
-            chunks = db.query(Chunk).outerjoin(Embedding, Chunk.id == Embedding.chunk_id)\
+            chunks = db.query(Chunk.id, Chunk.page_id, chunk_text_column(), Chunk.chunk_index, Chunk.token_ids)\
+                .join(Page, Page.id == Chunk.page_id)\
+                .outerjoin(Embedding, Chunk.id == Embedding.chunk_id)\
                 .filter(Chunk.chunk_text.isnot(None))\
-                .filter(Chunk.chunk_text != '')\
+                .filter(or_(Chunk.chunk_text != '', Chunk.end_char > Chunk.start_char))\
                 .filter(Embedding.id.is_(None))\
+                .filter(Chunk.id > after_id)\
+                .order_by(Chunk.id)\
                 .limit(limit)\
                 .all()
             
@@ -351,7 +871,8 @@ class SQLClient:
                     'id': chunk.id,
                     'page_id': chunk.page_id,
                     'chunk_text': chunk.chunk_text,
-                    'chunk_index': chunk.chunk_index
+                    'chunk_index': chunk.chunk_index,
+                    'token_ids': decode_token_ids(chunk.token_ids).tolist() if chunk.token_ids else None
                 })
             return result
         finally:
@@ -359,8 +880,7 @@ class SQLClient:
             
     async def mark_chunk_embedded(self, chunk_id: int) -> bool:
         """Mark chunk as having embeddings generated"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._mark_chunk_embedded_sync, chunk_id)
+        return await self._run(self._mark_chunk_embedded_sync, chunk_id)
     
     def _mark_chunk_embedded_sync(self, chunk_id: int) -> bool:
         db = self.SessionLocal()
@@ -377,10 +897,73 @@ class SQLClient:
         finally:
             db.close()
     
+    async def get_embeddings_after(self, last_id: int = 0, limit: int = 5000) -> List[Dict[str, Any]]:
+        """Get embedding rows with an id greater than last_id, oldest first"""
+        return await self._run(self._get_embeddings_after_sync, last_id, limit)
+    
+    def _get_embeddings_after_sync(self, last_id: int = 0, limit: int = 5000) -> List[Dict[str, Any]]:
+        db = self.SessionLocal()
+        try:
+            rows = db.query(Embedding.id, Embedding.chunk_id, Embedding.vector)\
+                .filter(Embedding.id > last_id)\
+                .filter(Embedding.vector.isnot(None))\
+                .order_by(Embedding.id.asc())\
+                .limit(limit)\
+                .all()
+            
+            return [
+                {'id': row.id, 'chunk_id': row.chunk_id, 'vector': decode_vector(row.vector)}
+                for row in rows
+            ]
+        finally:
+            db.close()
+    
+    async def get_deleted_chunks_after(self, last_id: int = 0, limit: int = 5000) -> List[Dict[str, Any]]:
+        """Get deleted_chunks log rows with an id greater than last_id, oldest first"""
+        return await self._run(self._get_deleted_chunks_after_sync, last_id, limit)
+    
+    def _get_deleted_chunks_after_sync(self, last_id: int = 0, limit: int = 5000) -> List[Dict[str, Any]]:
+        db = self.SessionLocal()
+        try:
+            rows = db.query(DeletedChunk.id, DeletedChunk.chunk_id)\
+                .filter(DeletedChunk.id > last_id)\
+                .order_by(DeletedChunk.id.asc())\
+                .limit(limit)\
+                .all()
+            return [{'id': row.id, 'chunk_id': row.chunk_id} for row in rows]
+        finally:
+            db.close()
+    
+    async def get_chunks_by_ids(self, chunk_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get chunks together with the URL and title of their page"""
+        return await self._run(self._get_chunks_by_ids_sync, chunk_ids)
+    
+    def _get_chunks_by_ids_sync(self, chunk_ids: List[int]) -> List[Dict[str, Any]]:
+        if not chunk_ids:
+            return []
+        db = self.SessionLocal()
+        try:
+            rows = db.query(Chunk.id, Chunk.page_id, chunk_text_column(), Page.url, Page.title)\
+                .join(Page, Page.id == Chunk.page_id)\
+                .filter(Chunk.id.in_(chunk_ids))\
+                .all()
+            
+            return [
+                {
+                    'id': row.id,
+                    'page_id': row.page_id,
+                    'chunk_text': row.chunk_text,
+                    'url': row.url,
+                    'title': row.title
+                }
+                for row in rows
+            ]
+        finally:
+            db.close()
+    
     async def mark_embedding_generated(self, page_id: int) -> bool:
         """Mark page as having embeddings generated"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._mark_embedding_generated_sync, page_id)
+        return await self._run(self._mark_embedding_generated_sync, page_id)
     
     def _mark_embedding_generated_sync(self, page_id: int) -> bool:
         db = self.SessionLocal()
@@ -397,15 +980,22 @@ class SQLClient:
         finally:
             db.close()
     
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Turn free text into an FTS5 query of quoted terms (implicit AND)"""
+        return ' '.join(f'"{term}"' for term in re.findall(r'\w+', query))
+    
     async def search_content(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Search content using text search (fallback until vector search is implemented)"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._search_content_sync, query, limit)
+        """Keyword search ranked by bm25, falling back to LIKE scans without FTS5"""
+        return await self._run(self._search_content_sync, query, limit)
     
     def _search_content_sync(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        fts_query = self._fts_query(query) if self.fts_enabled else ''
+        if fts_query:
+            return self._search_content_fts_sync(query, fts_query, limit)
+        
         db = self.SessionLocal()
         try:
-            # Simple text search for now - will be enhanced with vector search
             results = db.query(Page).filter(
                 (Page.title.contains(query)) | 
                 (Page.content.contains(query))
@@ -432,10 +1022,92 @@ class SQLClient:
         finally:
             db.close()
     
+    def _search_content_fts_sync(self, query: str, fts_query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        db = self.SessionLocal()
+        try:
+            # Title matches weigh 10x body matches; bm25 is lower-is-better
+            rows = db.execute(text("""
+                SELECT p.id, p.url, p.title, substr(p.content, 1, 500) AS content, p.content_hash,
+                       snippet(pages_fts, 1, '<b>', '</b>', '...', 32) AS snippet,
+                       bm25(pages_fts, 10.0, 1.0) AS rank
+                FROM pages_fts
+                JOIN pages p ON p.id = pages_fts.rowid
+                WHERE pages_fts MATCH :query
+                ORDER BY rank
+                LIMIT :limit
+            """), {'query': fts_query, 'limit': limit}).fetchall()
+            
+            search_log = SearchLog(query=query, results_count=len(rows))
+            db.add(search_log)
+            db.commit()
+            
+            return [
+                {
+                    'id': row.id,
+                    'url': row.url,
+                    'title': row.title,
+                    'content': row.content,
+                    'hash': row.content_hash,
+                    'snippet': row.snippet,
+                    'score': -row.rank
+                }
+                for row in rows
+            ]
+        except Exception:
+            db.rollback()
+            return []
+        finally:
+            db.close()
+    
+    async def search_chunks(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Keyword search over chunk text, ranked by bm25 when FTS5 is available"""
+        return await self._run(self._search_chunks_sync, query, limit)
+    
+    def _search_chunks_sync(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        
+        db = self.SessionLocal()
+        try:
+            if self.fts_enabled:
+                rows = db.execute(text("""
+                    SELECT c.id, c.page_id, c.chunk_text, p.url, p.title,
+                           snippet(chunks_fts, 0, '<b>', '</b>', '...', 32) AS snippet,
+                           -bm25(chunks_fts) AS score
+                    FROM chunks_fts
+                    JOIN chunk_texts c ON c.id = chunks_fts.rowid
+                    JOIN pages p ON p.id = c.page_id
+                    WHERE chunks_fts MATCH :query
+                    ORDER BY score DESC
+                    LIMIT :limit
+                """), {'query': fts_query, 'limit': limit}).fetchall()
+            else:
+                text_column = chunk_text_column()
+                rows = db.query(Chunk.id, Chunk.page_id, text_column, Page.url, Page.title)\
+                    .join(Page, Page.id == Chunk.page_id)\
+                    .filter(text_column.contains(query))\
+                    .limit(limit)\
+                    .all()
+            
+            return [
+                {
+                    'id': row.id,
+                    'page_id': row.page_id,
+                    'url': row.url,
+                    'title': row.title,
+                    'content': row.chunk_text,
+                    'snippet': getattr(row, 'snippet', None),
+                    'score': getattr(row, 'score', 0.0)
+                }
+                for row in rows
+            ]
+        finally:
+            db.close()
+    
     async def get_pages(self, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
         """Get pages with pagination"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._get_pages_sync, skip, limit)
+        return await self._run(self._get_pages_sync, skip, limit)
     
     def _get_pages_sync(self, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
         db = self.SessionLocal()
@@ -459,8 +1131,7 @@ class SQLClient:
     
     async def get_stats(self) -> Dict[str, Any]:
         """Get system statistics"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._get_stats_sync)
+        return await self._run(self._get_stats_sync)
     
     def _get_stats_sync(self) -> Dict[str, Any]:
         db = self.SessionLocal()
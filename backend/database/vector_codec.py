@@ -0,0 +1,75 @@
+"""
+Binary encoding for embedding vectors and chunk token ids
+A vector is stored as an 8-byte header (magic, dtype code, dimension)
+followed by the raw little-endian values; token ids use the same layout
+"""
+
+import json
+import struct
+from typing import Union
+
+import numpy as np
+
+MAGIC = b'SV'
+# magic, dtype code, padding, dimension - 8 bytes keeps the payload 8-byte aligned
+HEADER = struct.Struct('<2sBxI')
+
+DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f2'),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+
+def encode_vector(vector, dtype: str = '<f4') -> bytes:
+    """Encode a 1-d vector as header + raw values"""
+    dtype = np.dtype(dtype)
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported vector dtype: {dtype}")
+    values = np.ascontiguousarray(vector, dtype=dtype).reshape(-1)
+    return HEADER.pack(MAGIC, DTYPE_CODES[dtype], len(values)) + values.tobytes()
+
+
+def is_encoded(value) -> bool:
+    """Check whether a stored value uses the binary format"""
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:2]) == MAGIC
+
+
+def decode_vector(value: Union[bytes, bytearray, memoryview, str]) -> np.ndarray:
+    """
+    Decode a stored vector
+
+    Binary values are returned as a read-only view over the buffer (no copy).
+    Legacy JSON text from before the migration is still accepted.
+    """
+    if isinstance(value, str):
+        return np.asarray(json.loads(value), dtype=np.float32)
+    if not is_encoded(value):
+        raise ValueError("Value is not an encoded vector")
+
+    magic, code, dim = HEADER.unpack_from(value)
+    dtype = DTYPES.get(code)
+    if dtype is None:
+        raise ValueError(f"Unknown vector dtype code: {code}")
+    return np.frombuffer(value, dtype=dtype, count=dim, offset=HEADER.size)
+
+
+TOKEN_MAGIC = b'ST'
+TOKEN_DTYPES = {
+    1: np.dtype('<u2'),
+    2: np.dtype('<u4'),
+}
+
+
+def encode_token_ids(token_ids) -> bytes:
+    """Encode token ids as header + uint16 values, or uint32 if the vocabulary needs it"""
+    values = np.asarray(token_ids, dtype=np.int64).reshape(-1)
+    code = 1 if not len(values) or values.max() < 1 << 16 else 2
+    return HEADER.pack(TOKEN_MAGIC, code, len(values)) + values.astype(TOKEN_DTYPES[code]).tobytes()
+
+
+def decode_token_ids(value: Union[bytes, bytearray, memoryview]) -> np.ndarray:
+    magic, code, count = HEADER.unpack_from(value)
+    if magic != TOKEN_MAGIC or code not in TOKEN_DTYPES:
+        raise ValueError("Value is not encoded token ids")
+    return np.frombuffer(value, dtype=TOKEN_DTYPES[code], count=count, offset=HEADER.size)
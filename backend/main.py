@@ -1,9 +1,11 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import asyncio
+import io
+import os
 
 app = FastAPI(title="ScrapAI")
 
@@ -17,11 +19,18 @@ app.add_middleware(
 # Add this Pydantic model for request validation
 class CrawlRequest(BaseModel):
     urls: List[str]
+    priority: int = 0
 
 # Import database client
+from backend.config import config
 from backend.database.client import DatabaseClient
+from backend.scraper.frontier import EnqueueError, enqueue_seeds, parse_seed_lines
 db_client = DatabaseClient()
 
+@app.on_event("shutdown")
+async def close_database():
+    await db_client.close()
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Serve a simple frontend interface"""
@@ -266,13 +275,34 @@ async def get_status():
 # FIXED: Use the Pydantic model
 @app.post("/api/v1/crawl")
 async def crawl_urls(request: CrawlRequest):
-    """Add URLs to crawl queue"""
-    added_count = 0
-    for url in request.urls:
-        if await db_client.add_to_queue(url):
-            added_count += 1
-    stats = await db_client.get_stats()
-    return {"message": f"Added {added_count} URLs to queue", "queued": stats["queued"]}
+    """Add URLs to crawl queue in a single transaction"""
+    try:
+        counts = await enqueue_seeds(
+            db_client,
+            ({'url': url, 'priority': request.priority} for url in request.urls),
+            batch_size=max(len(request.urls), 1)
+        )
+    except EnqueueError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue URLs: {e}")
+    return {"message": f"Added {counts['added']} URLs to queue", **counts}
+
+@app.post("/api/v1/crawl/upload")
+async def upload_crawl_file(file: UploadFile = File(...), format: Optional[str] = None):
+    """Add URLs from an NDJSON (.ndjson/.jsonl) or CSV upload to the crawl queue"""
+    fmt = format
+    if fmt is None:
+        extension = os.path.splitext(file.filename or '')[1].lower()
+        fmt = {'.ndjson': 'ndjson', '.jsonl': 'ndjson', '.csv': 'csv'}.get(extension)
+    if fmt not in ('ndjson', 'csv'):
+        raise HTTPException(status_code=400, detail="Upload a .ndjson, .jsonl or .csv file, or pass format=ndjson|csv")
+    
+    # enqueue_seeds reads and parses the lines in a thread, one batch at a time
+    lines = io.TextIOWrapper(file.file, encoding='utf-8', errors='replace', newline='')
+    try:
+        counts = await enqueue_seeds(db_client, parse_seed_lines(lines, fmt))
+    except EnqueueError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue URLs: {e}")
+    return {"message": f"Added {counts['added']} URLs to queue", **counts}
 
 @app.get("/api/v1/stats")
 async def get_stats():
@@ -280,8 +310,15 @@ async def get_stats():
     return await db_client.get_stats()
 
 @app.get("/api/v1/search")
-async def search_content(q: str = "", limit: int = 10):
-    """Search content"""
+async def search_content(q: str = "", limit: int = 10, mode: str = config.search.default_mode,
+                         nprobe: Optional[int] = None):
+    """Search content by keyword, vector similarity or both (hybrid)"""
+    if mode == "vector":
+        return await db_client.vector_search(q, limit, nprobe)
+    if mode == "hybrid":
+        return await db_client.hybrid_search(q, limit, nprobe)
+    if mode != "keyword":
+        raise HTTPException(status_code=400, detail=f"Unknown search mode: {mode}")
     results = await db_client.search_content(q, limit)
     return results
 
@@ -308,9 +345,9 @@ async def add_page(page_data: dict):
 async def test_crawl(url: str = "https://httpbin.org/html"):
     """Test crawling a URL directly"""
     import requests
-    from bs4 import BeautifulSoup
     import hashlib
     import re
+    from backend.scraper.extractors import get_extractor
     
     try:
         # Fetch the page
@@ -318,15 +355,11 @@ async def test_crawl(url: str = "https://httpbin.org/html"):
         html = response.text
         
         # Extract content
-        soup = BeautifulSoup(html, 'html.parser')
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        title = soup.find('title')
-        title_text = title.text.strip() if title else url
+        extractor = get_extractor(remove_tags=('script', 'style'), content_selectors=(), noise_selector=None)
+        parsed = extractor.parse(html)
+        title_text = parsed['title'] if parsed['title'] is not None else url
         
-        body = soup.find('body')
-        text = body.get_text() if body else ""
+        text = parsed['text'] or ""
         text = re.sub(r'\s+', ' ', text)
         
         page_data = {
@@ -347,27 +380,21 @@ async def test_crawl_direct(url: str = "https://httpbin.org/html"):
     """Test crawling directly"""
     try:
         import requests
-        from bs4 import BeautifulSoup
         import hashlib
+        from backend.scraper.extractors import get_extractor
         
         response = requests.get(url, timeout=10)
         html = response.text
         
-        soup = BeautifulSoup(html, 'html.parser')
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        title = soup.find('title')
-        title_text = title.text.strip() if title else "No Title"
+        # Try article content first, then fall back to the whole body
+        extractor = get_extractor(
+            remove_tags=('script', 'style'), content_selectors=('article', 'main'), noise_selector=None
+        )
+        parsed = extractor.parse(html)
+        title_text = parsed['title'] if parsed['title'] is not None else "No Title"
         
         # Get meaningful content
-        body = soup.find('body')
-        if body:
-            # Try to find article content
-            article = body.find('article') or body.find('main') or body
-            text = article.get_text(separator=' ', strip=True)
-        else:
-            text = "No content found"
+        text = parsed['text'] if parsed['text'] is not None else "No content found"
         
         # Clean text
         import re
@@ -7,8 +7,8 @@ class SmartCrawler:
         self.crawler = LightweightCrawler()
         self.db = DatabaseClient()
         
-    def can_fetch(self, url: str) -> bool:
-        return self.crawler.can_fetch(url)
+    async def can_fetch(self, url: str) -> bool:
+        return await self.crawler.can_fetch(url)
     
     async def render_js_page(self, url: str) -> str:
         """Use simple fetch - no JavaScript rendering"""
@@ -0,0 +1,285 @@
+"""
+Pluggable HTML content extractors for ScrapAI
+BeautifulSoup (html.parser) is the reference implementation; the lxml and
+selectolax backends return the same fields several times faster
+"""
+
+import hashlib
+import re
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from backend.config import config
+from backend.scraper.frontier import normalize_url
+
+try:
+    from lxml import etree, html as lxml_html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml_html = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+REMOVE_TAGS = ('script', 'style', 'nav', 'header', 'footer', 'aside', 'form')
+
+CONTENT_SELECTORS = (
+    'article',
+    'main',
+    '[role="main"]',
+    '.content',
+    '.post-content',
+    '.entry-content',
+    '.article-content',
+    '.post-body',
+    '.story-content',
+    '.page-content',
+)
+
+# Removed from <body> only when no content selector matched
+NOISE_SELECTOR = '.sidebar, .menu, .comments, .advertisement'
+
+
+def clean_text(text: str) -> str:
+    """Clean and normalize text"""
+    if not text:
+        return ""
+
+    # Remove extra whitespace and normalize
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+
+    # Remove very short lines (likely noise)
+    lines = [line.strip() for line in text.split('\n') if len(line.strip()) > 20]
+
+    return '\n'.join(lines)
+
+
+class Extractor:
+    """
+    Base class for extraction backends
+
+    Subclasses implement parse(), which returns the raw title, meta
+    description and newline-separated text of the main content element.
+    extract() turns that into the title/content/hash fields the crawlers
+    store, so every backend shares the same cleaning rules.
+    """
+
+    name = 'base'
+
+    def __init__(self, remove_tags: Sequence[str] = REMOVE_TAGS,
+                 content_selectors: Sequence[str] = CONTENT_SELECTORS,
+                 noise_selector: Optional[str] = NOISE_SELECTOR):
+        self.remove_tags = tuple(remove_tags)
+        self.content_selectors = tuple(content_selectors)
+        self.noise_selector = noise_selector
+
+    def parse(self, html: str) -> Dict[str, Optional[str]]:
+        """
+        Return {'title': str or None, 'description': str, 'text': str or None,
+        'base': <base href> or None, 'links': raw hrefs of followable <a> tags}
+        """
+        raise NotImplementedError
+
+    def extract(self, html: str, url: str) -> dict:
+        parsed = self.parse(html)
+        title = parsed['title'] if parsed['title'] is not None else url
+        text = clean_text(parsed['text']) if parsed['text'] is not None else ""
+
+        # Combine title, description and content
+        content = clean_text(f"{title}\n{parsed['description']}\n{text}")
+        return {
+            'title': title,
+            'description': parsed['description'],
+            'content': content,
+            'content_hash': hashlib.sha256(content.encode()).hexdigest() if content else '',
+            'word_count': len(content.split()),
+            'links': self.resolve_links(parsed['links'], parsed['base'], url)
+        }
+
+    @staticmethod
+    def resolve_links(hrefs: Sequence[str], base: Optional[str], url: str) -> List[str]:
+        """Absolute, normalized, de-duplicated links in page order, capped at max_links_per_page"""
+        base_url = urljoin(url, base) if base else url
+        links = {}
+        for href in hrefs:
+            link = normalize_url(href, base_url)
+            if link and link != url:
+                links[link] = None
+                if len(links) >= config.crawler.max_links_per_page:
+                    break
+        return list(links)
+
+
+class BeautifulSoupExtractor(Extractor):
+    name = 'bs4'
+
+    def parse(self, html: str) -> Dict[str, Optional[str]]:
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Links are collected before navigation and footers are stripped
+        base = soup.find('base', href=True)
+        links = [
+            a['href'] for a in soup.find_all('a', href=True)
+            if 'nofollow' not in (a.get('rel') or [])
+        ]
+
+        for element in soup(list(self.remove_tags)):
+            element.decompose()
+
+        content_element = None
+        for selector in self.content_selectors:
+            content_element = soup.select_one(selector)
+            if content_element:
+                break
+
+        if not content_element:
+            content_element = soup.find('body')
+            if content_element and self.noise_selector:
+                for noise in content_element.select(self.noise_selector):
+                    noise.decompose()
+
+        title = soup.find('title')
+        meta_desc = soup.find('meta', attrs={'name': 'description'})
+        return {
+            'title': title.get_text().strip() if title else None,
+            'description': meta_desc.get('content', '') if meta_desc else '',
+            'text': content_element.get_text(separator='\n', strip=True) if content_element else None,
+            'base': base['href'] if base else None,
+            'links': links
+        }
+
+
+class LxmlExtractor(Extractor):
+    name = 'lxml'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Compile the CSS selectors to XPath once rather than per page
+        self._content_selectors = [CSSSelector(selector) for selector in self.content_selectors]
+        self._noise_selector = CSSSelector(self.noise_selector) if self.noise_selector else None
+        self._parser = lxml_html.HTMLParser(encoding='utf-8')
+
+    def parse(self, html: str) -> Dict[str, Optional[str]]:
+        # Parse bytes: lxml rejects str input that carries an encoding declaration
+        try:
+            root = lxml_html.document_fromstring(html.encode('utf-8', 'replace'), parser=self._parser)
+        except etree.ParserError:
+            # Blank or comment-only documents have no root element; the other backends see an empty page
+            return {'title': None, 'description': '', 'text': None, 'base': None, 'links': []}
+
+        base = root.xpath('//base/@href')
+        links = [
+            a.get('href') for a in root.iter('a')
+            if a.get('href') is not None and 'nofollow' not in (a.get('rel') or '').lower().split()
+        ]
+
+        # drop_tree keeps the tail text, as BeautifulSoup's decompose does
+        for element in list(root.iter(*self.remove_tags)):
+            element.drop_tree()
+
+        content_element = None
+        for selector in self._content_selectors:
+            matches = selector(root)
+            if matches:
+                content_element = matches[0]
+                break
+
+        if content_element is None:
+            content_element = root.find('body')
+            if content_element is not None and self._noise_selector is not None:
+                for noise in self._noise_selector(content_element):
+                    noise.drop_tree()
+
+        title = root.find('.//title')
+        meta_desc = root.xpath('//meta[@name="description"]')
+        text = None
+        if content_element is not None:
+            text = '\n'.join(s.strip() for s in content_element.itertext() if s.strip())
+        return {
+            'title': title.text_content().strip() if title is not None else None,
+            'description': meta_desc[0].get('content', '') if meta_desc else '',
+            'text': text,
+            'base': base[0] if base else None,
+            'links': links
+        }
+
+
+class SelectolaxExtractor(Extractor):
+    name = 'selectolax'
+
+    def parse(self, html: str) -> Dict[str, Optional[str]]:
+        tree = LexborHTMLParser(html)
+
+        base = tree.css_first('base[href]')
+        links = []
+        for a in tree.css('a[href]'):
+            attributes = a.attributes
+            if attributes.get('href') and 'nofollow' not in (attributes.get('rel') or '').lower().split():
+                links.append(attributes['href'])
+
+        tree.strip_tags(list(self.remove_tags))
+
+        content_element = None
+        for selector in self.content_selectors:
+            content_element = tree.css_first(selector)
+            if content_element is not None:
+                break
+
+        if content_element is None:
+            content_element = tree.body
+            if content_element is not None and self.noise_selector:
+                for noise in content_element.css(self.noise_selector):
+                    noise.decompose()
+
+        title = tree.css_first('title')
+        meta_desc = tree.css_first('meta[name="description"]')
+        return {
+            'title': title.text().strip() if title is not None else None,
+            # A valueless content attribute comes back as None
+            'description': (meta_desc.attributes.get('content') or '') if meta_desc is not None else '',
+            'text': content_element.text(separator='\n', strip=True) if content_element is not None else None,
+            'base': base.attributes.get('href') if base is not None else None,
+            'links': links
+        }
+
+
+EXTRACTORS = {
+    'selectolax': SelectolaxExtractor,
+    'lxml': LxmlExtractor,
+    'bs4': BeautifulSoupExtractor,
+}
+
+
+def available_extractors() -> Sequence[str]:
+    """Backend names whose parser library is installed, fastest first"""
+    installed = {
+        'selectolax': LexborHTMLParser is not None,
+        'lxml': lxml_html is not None,
+        'bs4': True,
+    }
+    return [name for name in EXTRACTORS if installed[name]]
+
+
+def get_extractor(name: Optional[str] = None, **options) -> Extractor:
+    """
+    Build an extractor by name ("auto", "selectolax", "lxml" or "bs4")
+
+    "auto" picks the fastest installed backend. The default comes from
+    config.crawler.extractor; options override the tags, selectors and noise
+    selector used by the crawler.
+    """
+    name = name or config.crawler.extractor
+    available = available_extractors()
+    if name == 'auto':
+        name = available[0]
+    elif name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor '{name}', expected one of: auto, {', '.join(EXTRACTORS)}")
+    elif name not in available:
+        raise ValueError(f"Extractor '{name}' is not installed")
+    return EXTRACTORS[name](**options)
@@ -0,0 +1,386 @@
+"""
+Crawl frontier for ScrapAI
+URL normalization and scope rules for discovered links, and a persistent
+scalable Bloom filter of URLs already seen so that de-duplicating the
+frontier costs a few bit lookups instead of a database round trip per link
+"""
+
+import asyncio
+import csv
+import hashlib
+import json
+import math
+import os
+import struct
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit
+
+from backend.config import config
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only track the click and never change the page
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'mc_cid', 'mc_eid', '_ga')
+
+SKIPPED_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp', '.tif', '.tiff',
+    '.mp3', '.mp4', '.avi', '.mov', '.wmv', '.webm', '.ogg', '.wav', '.flac',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.tar', '.exe', '.dmg', '.iso', '.apk',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.css', '.js', '.json', '.xml', '.rss',
+    '.woff', '.woff2', '.ttf', '.eot',
+)
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Canonical absolute form of a link, or None if it isn't a crawlable http(s) URL
+
+    Resolves it against base, lowercases scheme and host, drops default
+    ports, fragments and tracking parameters, and sorts the query.
+    """
+    url = (url or '').strip()
+    if not url:
+        return None
+    if base:
+        url = urljoin(base, url)
+    url, _ = urldefrag(url)
+
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if parts.username or parts.password:
+        return None
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+
+    # Pairs are sorted as-is, so their percent-encoding is left untouched
+    query = sorted(
+        pair for pair in parts.query.split('&')
+        if pair and not pair.split('=', 1)[0].lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, netloc, _remove_dot_segments(parts.path) or '/', '&'.join(query), ''))
+
+
+def _remove_dot_segments(path: str) -> str:
+    """RFC 3986 section 5.2.4: resolve '.' and '..' in an absolute path"""
+    if '.' not in path:
+        return path
+    output: List[str] = []
+    segments = path.split('/')
+    for i, segment in enumerate(segments):
+        if segment == '.':
+            if i == len(segments) - 1:
+                output.append('')
+        elif segment == '..':
+            if len(output) > 1:
+                output.pop()
+            if i == len(segments) - 1:
+                output.append('')
+        else:
+            output.append(segment)
+    return '/'.join(output)
+
+
+def _site(host: str) -> str:
+    return host[4:] if host.startswith('www.') else host
+
+
+def in_scope(url: str, parent_url: str) -> bool:
+    """Apply the configured domain and file-type rules to a discovered link"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if parts.path.lower().endswith(SKIPPED_EXTENSIONS):
+        return False
+
+    allowed = config.crawler.allowed_domains
+    if allowed:
+        if not any(host == domain or host.endswith(f".{domain}") for domain in allowed):
+            return False
+    if config.crawler.same_domain_only:
+        parent_host = (urlsplit(parent_url).hostname or '').lower()
+        return _site(host) == _site(parent_host)
+    return True
+
+
+class BloomFilter:
+    """Fixed-capacity Bloom filter over a bytearray, using double hashing"""
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytearray] = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: str) -> None:
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows by adding larger, tighter layers as it fills
+
+    Layer i holds capacity * growth**i keys at error_rate * (1 - r) * r**i,
+    so the overall false-positive rate stays below error_rate however many
+    URLs are added (Almeida et al., "Scalable Bloom Filters"). A false
+    positive means a new link is skipped, never that one is crawled twice.
+    """
+
+    MAGIC = b'SBF1'
+    GROWTH = 2
+    TIGHTENING = 0.9
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.layers: List[BloomFilter] = []
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    def __contains__(self, key: str) -> bool:
+        return any(key in layer for layer in self.layers)
+
+    def _new_layer(self) -> BloomFilter:
+        i = len(self.layers)
+        layer = BloomFilter(
+            self.capacity * self.GROWTH ** i,
+            self.error_rate * (1 - self.TIGHTENING) * self.TIGHTENING ** i
+        )
+        self.layers.append(layer)
+        return layer
+
+    def add(self, key: str) -> bool:
+        """Add key; returns False if it was (probably) already present"""
+        if key in self:
+            return False
+        layer = self.layers[-1] if self.layers and not self.layers[-1].full else self._new_layer()
+        layer.add(key)
+        return True
+
+    def save(self, path: str) -> None:
+        """Write the filter atomically: magic, header length, JSON header, layer bits"""
+        header = json.dumps({
+            'capacity': self.capacity,
+            'error_rate': self.error_rate,
+            'layers': [
+                {'capacity': layer.capacity, 'error_rate': layer.error_rate, 'count': layer.count}
+                for layer in self.layers
+            ]
+        }).encode()
+        # A temp file per writer, since crawler processes can share one path
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.", suffix='.tmp'
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.MAGIC + struct.pack('<I', len(header)) + header)
+                for layer in self.layers:
+                    f.write(layer.bits)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'ScalableBloomFilter':
+        with open(path, 'rb') as f:
+            if f.read(4) != cls.MAGIC:
+                raise ValueError(f"{path} is not a Bloom filter file")
+            header_length, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_length))
+            bloom = cls(header['capacity'], header['error_rate'])
+            for spec in header['layers']:
+                layer = BloomFilter(spec['capacity'], spec['error_rate'], count=spec['count'])
+                layer.bits = bytearray(f.read(len(layer.bits)))
+                bloom.layers.append(layer)
+        return bloom
+
+
+class Frontier:
+    """Filters discovered links through scope rules and the seen-set, then bulk-enqueues them"""
+
+    def __init__(self, db, path: Optional[str] = None):
+        self.db = db
+        self.path = path or config.crawler.frontier_path
+        self.loaded = False
+        if os.path.exists(self.path):
+            self.seen = ScalableBloomFilter.load(self.path)
+            self.loaded = True
+        else:
+            self.seen = ScalableBloomFilter(config.crawler.frontier_capacity, config.crawler.frontier_error_rate)
+        self.dirty = False
+
+    async def warm(self, batch_size: int = 10000) -> int:
+        """Seed a new filter with every URL already in the crawl queue"""
+        if self.loaded:
+            return 0
+        added = 0
+        last_id = 0
+        while True:
+            rows = await self.db.get_queue_urls_after(last_id, batch_size)
+            if not rows:
+                break
+            for row in rows:
+                self.seen.add(row['url'])
+            added += len(rows)
+            last_id = rows[-1]['id']
+        self.loaded = True
+        self.dirty = added > 0
+        return added
+
+    def filter_new(self, urls: Iterable[str]) -> List[str]:
+        """URLs not seen before, marking them as seen"""
+        new = [url for url in urls if self.seen.add(url)]
+        if new:
+            self.dirty = True
+        return new
+
+    async def add_links(self, links: Iterable[str], parent_url: str, depth: int) -> int:
+        """Enqueue in-scope unseen links found on a page at depth - 1; returns how many were queued"""
+        if depth > config.crawler.max_depth:
+            return 0
+        new = self.filter_new(link for link in links if in_scope(link, parent_url))
+        if not new:
+            return 0
+        # Shallower pages first: priority drops with depth
+        return await self.db.add_to_queue_bulk([
+            {'url': url, 'depth': depth, 'priority': -depth} for url in new
+        ])
+
+    def save(self) -> None:
+        if self.dirty:
+            self.dirty = False
+            self.seen.save(self.path)
+
+
+def parse_seed_lines(lines: Iterable[str], fmt: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield {'url', 'priority'} items from an uploaded seed file
+
+    ndjson: one JSON string, or object with "url" and optional "priority", per line.
+    csv: a "url" column (and optional "priority") if there is a header row,
+    otherwise the first column. Unparseable entries come back with an empty url.
+    """
+    if fmt == 'ndjson':
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError:
+                yield {'url': ''}
+                continue
+            if isinstance(value, str):
+                yield {'url': value}
+            elif isinstance(value, dict):
+                yield {'url': value.get('url') or '', 'priority': value.get('priority')}
+            else:
+                yield {'url': ''}
+    elif fmt == 'csv':
+        url_column, priority_column = 0, None
+        for i, row in enumerate(csv.reader(lines)):
+            if not row:
+                continue
+            if i == 0:
+                header = [column.strip().lower() for column in row]
+                if 'url' in header:
+                    url_column = header.index('url')
+                    priority_column = header.index('priority') if 'priority' in header else None
+                    continue
+            yield {
+                'url': row[url_column] if url_column < len(row) else '',
+                'priority': row[priority_column] if priority_column is not None and priority_column < len(row) else None
+            }
+    else:
+        raise ValueError(f"Unknown seed file format '{fmt}', expected ndjson or csv")
+
+
+class EnqueueError(Exception):
+    """A batch of seed URLs failed to insert; counts covers the batches queued before it"""
+
+    def __init__(self, counts: Dict[str, int], error: Exception):
+        super().__init__(f"queued {counts['added']} URLs before failing: {error}")
+        self.counts = counts
+
+
+async def enqueue_seeds(db, items: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Normalize and de-duplicate seed URLs in memory, then queue them with one
+    INSERT ... ON CONFLICT per batch
+
+    Seeds that finished crawling at least crawler.recrawl_min_age seconds ago
+    are queued again, so resubmitting a URL re-crawls it. Returns counts of
+    URLs submitted, added (or re-queued), already queued (or repeated in the
+    input) and invalid. Raises EnqueueError if a batch fails to insert.
+    """
+    batch_size = batch_size or config.crawler.enqueue_batch_size
+    counts = {'submitted': 0, 'added': 0, 'duplicates': 0, 'invalid': 0}
+    seen = set()
+    items = iter(items)
+    exhausted = False
+    while not exhausted:
+        # Uploads are read from a file, so reading and normalizing happen off the event loop
+        batch, exhausted = await asyncio.to_thread(_next_seed_batch, items, batch_size, seen, counts)
+        if batch:
+            counts['added'] += await _insert_seed_batch(db, batch, counts)
+
+    counts['duplicates'] = counts['submitted'] - counts['invalid'] - counts['added']
+    return counts
+
+
+def _next_seed_batch(items: Iterator[Dict[str, Any]], batch_size: int, seen: set,
+                     counts: Dict[str, int]) -> Tuple[List[Dict[str, Any]], bool]:
+    """Up to batch_size new, normalized seed rows, and whether items ran out"""
+    batch = []
+    for item in items:
+        counts['submitted'] += 1
+        url = normalize_url(item.get('url') or '')
+        try:
+            priority = int(item.get('priority') or 0)
+        except (TypeError, ValueError):
+            url = None
+        if url is None:
+            counts['invalid'] += 1
+            continue
+        if url in seen:
+            continue
+        seen.add(url)
+        batch.append({'url': url, 'depth': 0, 'priority': priority})
+        if len(batch) >= batch_size:
+            return batch, False
+    return batch, True
+
+
+async def _insert_seed_batch(db, batch: List[Dict[str, Any]], counts: Dict[str, int]) -> int:
+    try:
+        return await db.add_to_queue_bulk(batch, refresh=True)
+    except Exception as e:
+        raise EnqueueError(counts, e) from e
@@ -1,18 +1,36 @@
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
 import hashlib
-import re
-from urllib.robotparser import RobotFileParser
+from dataclasses import dataclass
+from typing import Optional
 from urllib.parse import urlparse
 from backend.config import config
-import time
+from backend.scraper.extractors import clean_text, get_extractor
+from backend.scraper.response_body import ACCEPT_ENCODING, BodyTooLarge, decode_body, is_html, read_body
+from backend.scraper.robots import AsyncRobotsCache, robots_origin
+from backend.scraper.scheduler import PolitenessScheduler
+from backend.utils.simhash import simhash
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0  # 0 when the request itself failed
+    html: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    body_hash: str = ""  # sha256 of the decompressed response body
+    skipped: str = ""  # why a 200 response was not read (non-HTML, too large)
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
 
 class LightweightCrawler:
-    def __init__(self):
-        self.robots_parsers = {}
+    def __init__(self, scheduler: PolitenessScheduler = None):
         self.session = None
-        self.request_times = {}
+        self.robots = AsyncRobotsCache(self.get_session)
+        self.scheduler = scheduler or PolitenessScheduler()
+        self.extractor = get_extractor()
         
     async def get_session(self):
         if self.session is None:
@@ -21,63 +39,101 @@ class LightweightCrawler:
                     'User-Agent': config.crawler.user_agent,
                     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
                     'Accept-Language': 'en-US,en;q=0.5',
-                    'Accept-Encoding': 'gzip, deflate',
+                    'Accept-Encoding': ACCEPT_ENCODING,
                     'Connection': 'keep-alive',
                 },
-                timeout=aiohttp.ClientTimeout(total=30)
+                timeout=aiohttp.ClientTimeout(total=30),
+                # Bodies are decompressed by read_body so their size can be capped
+                auto_decompress=False
             )
         return self.session
         
-    def can_fetch(self, url: str) -> bool:
-        """Check robots.txt"""
+    async def can_fetch(self, url: str) -> bool:
+        """Check robots.txt and apply its Crawl-delay to the host"""
         if not config.crawler.respect_robots:
             return True
             
-        parsed = urlparse(url)
-        domain = parsed.netloc
-        
-        if domain not in self.robots_parsers:
-            self.robots_parsers[domain] = RobotFileParser()
-            robots_url = f"{parsed.scheme}://{domain}/robots.txt"
-            try:
-                self.robots_parsers[domain].set_url(robots_url)
-                self.robots_parsers[domain].read()
-            except:
-                return True
+        rules = await self.robots.rules_for(url)
+        crawl_delay = self.robots.crawl_delay(rules, config.crawler.user_agent)
+        if crawl_delay is not None:
+            host = PolitenessScheduler.host_of(url)
+            self.scheduler.set_delay(host, max(crawl_delay, self.scheduler.default_delay))
                 
-        return self.robots_parsers[domain].can_fetch(config.crawler.user_agent, url)
+        return rules.can_fetch(config.crawler.user_agent, url)
+    
+    def robots_retry_after(self, url: str) -> Optional[float]:
+        """Seconds until robots.txt is fetched again if can_fetch refused only because it was unavailable"""
+        if not config.crawler.respect_robots:
+            return None
+        return self.robots.retry_after(robots_origin(url))
     
     async def respect_delay(self, domain: str):
-        """Respect crawl delay for domain"""
-        if domain in self.request_times:
-            last_time = self.request_times[domain]
-            elapsed = time.time() - last_time
-            if elapsed < config.crawler.request_delay:
-                await asyncio.sleep(config.crawler.request_delay - elapsed)
-        self.request_times[domain] = time.time()
+        """Wait for this domain's next request slot in the politeness scheduler"""
+        await self.scheduler.reserve(PolitenessScheduler.host_of(f"//{domain}"))
     
-    async def fetch_page(self, url: str) -> str:
-        """Fetch page content without JavaScript"""
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                    wait_politely: bool = True) -> FetchResult:
+        """
+        Fetch a page, conditionally when validators from a previous crawl are given
+
+        A 304 comes back as not_modified with no body. Pass wait_politely=False
+        for URLs handed out by scheduler.get(), which has already reserved the
+        host's slot.
+        """
         session = await self.get_session()
         domain = urlparse(url).netloc
         
         # Respect crawl delay
-        await self.respect_delay(domain)
+        if wait_politely:
+            await self.respect_delay(domain)
+        
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
         
         try:
-            async with session.get(url, allow_redirects=True) as response:
+            async with session.get(url, headers=headers, allow_redirects=True) as response:
+                result = FetchResult(
+                    url=url,
+                    status=response.status,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified')
+                )
                 if response.status == 200:
-                    content = await response.text()
-                    return content
-                else:
+                    await self._read_html(response, result)
+                elif response.status != 304:
                     print(f"HTTP {response.status} for {url}")
-                    return ""
+                return result
         except asyncio.TimeoutError:
             print(f"Timeout fetching {url}")
-            return ""
+            return FetchResult(url=url)
         except Exception as e:
             print(f"Error fetching {url}: {e}")
-            return ""
+            return FetchResult(url=url)
+    
+    async def _read_html(self, response: aiohttp.ClientResponse, result: FetchResult) -> None:
+        """Stream the body into result, giving up early on non-HTML or oversized responses"""
+        if not is_html(response):
+            result.skipped = f"non-HTML content type {response.content_type}"
+        else:
+            try:
+                body = await read_body(response, config.crawler.max_body_size)
+                result.body_hash = hashlib.sha256(body).hexdigest()
+                result.html = decode_body(body, response.charset, config.crawler.charset_sniff_bytes)
+            except BodyTooLarge:
+                result.skipped = f"body larger than {config.crawler.max_body_size} bytes"
+        
+        if result.skipped:
+            # Drop the connection rather than draining the rest of the body
+            response.close()
+            print(f"Skipping {result.url}: {result.skipped}")
+    
+    async def fetch_page(self, url: str, wait_politely: bool = True) -> str:
+        """Fetch page content without JavaScript"""
+        result = await self.fetch(url, wait_politely=wait_politely)
+        return result.html
             
     def extract_content(self, html: str, url: str) -> dict:
         """Extract clean content from HTML"""
@@ -85,64 +141,15 @@ class LightweightCrawler:
             return {'title': 'Failed to fetch', 'content': '', 'content_hash': ''}
             
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Remove unwanted elements
-            for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form']):
-                element.decompose()
-            
-            # Try multiple content selectors
-            content_selectors = [
-                'article',
-                'main',
-                '[role="main"]',
-                '.content',
-                '.post-content', 
-                '.entry-content',
-                '.article-content',
-                '.post-body',
-                '.story-content',
-                '.page-content'
-            ]
-            
-            content_element = None
-            for selector in content_selectors:
-                content_element = soup.select_one(selector)
-                if content_element:
-                    break
-                    
-            if not content_element:
-                # Fallback: use body but remove common noise
-                content_element = soup.find('body')
-                if content_element:
-                    for noise in content_element.select('.sidebar, .menu, .comments, .advertisement'):
-                        noise.decompose()
-            
-            # Extract title
-            title = soup.find('title')
-            title_text = title.get_text().strip() if title else url
-            
-            # Extract meta description
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            description = meta_desc.get('content', '') if meta_desc else ''
-            
-            # Extract text content
-            if content_element:
-                text = content_element.get_text(separator='\n', strip=True)
-                text = self.clean_text(text)
-            else:
-                text = ""
-            
-            # Combine title, description and content
-            full_content = f"{title_text}\n{description}\n{text}"
-            full_content = self.clean_text(full_content)
-            
+            extracted = self.extractor.extract(html, url)
             return {
-                'title': title_text,
-                'content': full_content,
+                'title': extracted['title'],
+                'content': extracted['content'],
                 'html': html,
-                'content_hash': hashlib.sha256(full_content.encode()).hexdigest() if full_content else '',
-                'word_count': len(full_content.split())
+                'content_hash': extracted['content_hash'],
+                'word_count': extracted['word_count'],
+                'simhash': simhash(extracted['content'], min_words=config.crawler.near_duplicate_min_words),
+                'links': extracted['links']
             }
             
         except Exception as e:
@@ -151,19 +158,24 @@ class LightweightCrawler:
         
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
-        if not text:
-            return ""
-            
-        # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        # Remove very short lines (likely noise)
-        lines = [line.strip() for line in text.split('\n') if len(line.strip()) > 20]
-        
-        return '\n'.join(lines)
+        return clean_text(text)
         
     async def close(self):
         """Close session"""
         if self.session:
             await self.session.close()
+
+_process_crawler = None
+
+def parse_page(html: str, url: str) -> dict:
+    """
+    Module-level extract_content for use in a ProcessPoolExecutor
+
+    The raw HTML is left out of the result so it isn't pickled back to the parent.
+    """
+    global _process_crawler
+    if _process_crawler is None:
+        _process_crawler = LightweightCrawler()
+    content = _process_crawler.extract_content(html, url)
+    content.pop('html', None)
+    return content
@@ -1,9 +1,9 @@
 import requests
-from bs4 import BeautifulSoup
 import hashlib
 import re
-from urllib.parse import urlparse
 import time
+from backend.scraper.extractors import get_extractor
+from backend.scraper.robots import MAX_ROBOTS_BYTES, RobotsCache, robots_origin, robots_rules
 
 class MinimalCrawler:
     def __init__(self):
@@ -12,19 +12,26 @@ class MinimalCrawler:
             'User-Agent': 'ScrapAI-Bot/1.0',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         })
+        # Only scripts and styles are stripped, and <body> is used as-is as the fallback
+        self.extractor = get_extractor(
+            remove_tags=('script', 'style'),
+            content_selectors=('article', 'main', '.content', '.post-content'),
+            noise_selector=None
+        )
+        self.robots = RobotsCache()
         
     def can_fetch(self, url: str) -> bool:
-        """Simple robots.txt check"""
-        try:
-            parsed = urlparse(url)
-            robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-            response = self.session.get(robots_url, timeout=5)
-            if response.status_code == 200:
-                # Simple check - allow all for now
-                return True
-        except:
-            pass
-        return True
+        """robots.txt check, fetched once per host and cached"""
+        origin = robots_origin(url)
+        rules = self.robots.get(origin)
+        if rules is None:
+            try:
+                response = self.session.get(f"{origin}/robots.txt", timeout=5)
+                rules, ttl = robots_rules(response.status_code, response.text[:MAX_ROBOTS_BYTES])
+            except Exception:
+                rules, ttl = robots_rules(None)
+            self.robots.put(origin, rules, ttl)
+        return rules.can_fetch(self.session.headers['User-Agent'], url)
     
     def fetch_page(self, url: str) -> str:
         """Fetch page content"""
@@ -42,32 +49,12 @@ class MinimalCrawler:
             return {'title': 'Failed', 'content': '', 'hash': ''}
             
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Remove scripts and styles
-            for element in soup(['script', 'style']):
-                element.decompose()
-            
-            # Get title
-            title = soup.find('title')
-            title_text = title.text.strip() if title else url
-            
-            # Try to find main content
-            content_selectors = ['article', 'main', '.content', '.post-content']
-            content_element = None
-            
-            for selector in content_selectors:
-                content_element = soup.select_one(selector)
-                if content_element:
-                    break
-                    
-            if not content_element:
-                content_element = soup.find('body')
+            parsed = self.extractor.parse(html)
+            title_text = parsed['title'] if parsed['title'] is not None else url
             
             # Extract text
-            if content_element:
-                text = content_element.get_text(separator='\n', strip=True)
-                text = re.sub(r'\n\s*\n', '\n\n', text)
+            if parsed['text'] is not None:
+                text = re.sub(r'\n\s*\n', '\n\n', parsed['text'])
             else:
                 text = ""
                 
@@ -0,0 +1,228 @@
+"""
+Streaming response body handling for ScrapAI
+The crawler session runs with auto_decompress=False; bodies are read chunk by
+chunk, decompressed here and cut off at a size limit, so a huge or hostile
+response never has to fit in memory
+"""
+
+import codecs
+import logging
+import re
+import zlib
+from typing import Optional
+
+import aiohttp
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Output can only be bounded with a decompressor that supports output_buffer_limit
+if brotli and not hasattr(brotli.Decompressor, 'can_accept_more_data'):
+    logger.warning(
+        "Installed %s %s is too old to bound decompressed output; br responses are disabled "
+        "(install Brotli>=1.2.0)", brotli.__name__, getattr(brotli, '__version__', '')
+    )
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+# Advertise only what we can decode
+ACCEPT_ENCODING = ', '.join(
+    ['gzip', 'deflate'] + (['br'] if brotli else []) + (['zstd'] if zstandard else [])
+)
+
+CHUNK_SIZE = 16 * 1024
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_:.\-]+)', re.IGNORECASE)
+
+# Labels the HTML standard decodes as windows-1252
+_CHARSET_ALIASES = {'iso-8859-1': 'windows-1252', 'latin1': 'windows-1252', 'ascii': 'windows-1252',
+                    'us-ascii': 'windows-1252'}
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class _ZlibDecoder:
+    def __init__(self, wbits: int):
+        self.wbits = wbits
+        self._decoder = zlib.decompressobj(wbits)
+        self._started = False
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        try:
+            out = self._decoder.decompress(data, max_length)
+        except zlib.error:
+            if self._started or self.wbits != zlib.MAX_WBITS:
+                raise
+            # Some servers send raw deflate without the zlib header
+            self.wbits = -zlib.MAX_WBITS
+            self._decoder = zlib.decompressobj(self.wbits)
+            out = self._decoder.decompress(data, max_length)
+        self._started = True
+        # Output stops at max_length; read_body treats reaching it as too large
+        return out
+
+    def flush(self) -> bytes:
+        return self._decoder.flush()
+
+
+class _BrotliDecoder:
+    def __init__(self):
+        self._decoder = brotli.Decompressor()
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        out = self._decoder.process(data, output_buffer_limit=max_length)
+        # Drain pending output only while it still fits under max_length
+        while len(out) < max_length and not self._decoder.can_accept_more_data():
+            out += self._decoder.process(b"", output_buffer_limit=max_length - len(out))
+        return out
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _OutputFull(Exception):
+    pass
+
+
+class _BoundedSink:
+    """Write target for zstandard's stream_writer that stops it at a limit"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.limit = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        if len(self.buffer) >= self.limit:
+            raise _OutputFull()
+        return len(data)
+
+
+class _ZstdDecoder:
+    def __init__(self):
+        self._sink = _BoundedSink()
+        # Output reaches the sink CHUNK_SIZE bytes at a time
+        self._writer = zstandard.ZstdDecompressor().stream_writer(self._sink, write_size=CHUNK_SIZE)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        self._sink.limit = max_length
+        try:
+            self._writer.write(data)
+        except _OutputFull:
+            pass
+        out = bytes(self._sink.buffer[:max_length])
+        self._sink.buffer.clear()
+        return out
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _IdentityDecoder:
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def make_decoder(content_encoding: str):
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return _IdentityDecoder()
+    if encoding in ('gzip', 'x-gzip'):
+        return _ZlibDecoder(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return _ZlibDecoder(zlib.MAX_WBITS)
+    if encoding == 'br' and brotli:
+        return _BrotliDecoder()
+    if encoding == 'zstd' and zstandard:
+        return _ZstdDecoder()
+    raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+def is_html(response: aiohttp.ClientResponse) -> bool:
+    """True for HTML content types, or when the server sent none"""
+    content_type = response.headers.get('Content-Type')
+    return content_type is None or response.content_type in HTML_CONTENT_TYPES
+
+
+async def read_body(response: aiohttp.ClientResponse, max_bytes: int, truncate: bool = False) -> bytes:
+    """
+    Read and decompress a response body of at most max_bytes
+
+    Raises BodyTooLarge once the limit is passed, or with truncate=True
+    returns the first max_bytes instead. The limit applies to the
+    decompressed size, so compression bombs are caught too.
+    """
+    declared = response.content_length
+    if declared is not None and declared > max_bytes and not truncate:
+        raise BodyTooLarge()
+
+    decoder = make_decoder(response.headers.get('Content-Encoding'))
+    body = bytearray()
+    try:
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            body += decoder.decompress(chunk, max_bytes - len(body) + 1)
+            if len(body) > max_bytes:
+                raise BodyTooLarge()
+        body += decoder.flush()
+        if len(body) > max_bytes:
+            raise BodyTooLarge()
+    except BodyTooLarge:
+        if not truncate:
+            raise
+    return bytes(body[:max_bytes])
+
+
+def _normalize_charset(label: Optional[str]) -> Optional[str]:
+    if not label:
+        return None
+    label = label.strip().strip('"\'').lower()
+    label = _CHARSET_ALIASES.get(label, label)
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+
+def sniff_charset(body: bytes, declared: Optional[str] = None, sniff_bytes: int = 4096) -> str:
+    """
+    Pick the body's encoding: BOM, then the Content-Type charset, then a
+    <meta charset> in the first sniff_bytes, then UTF-8
+    """
+    if body.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if body.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    charset = _normalize_charset(declared)
+    if charset:
+        return charset
+
+    match = _META_CHARSET.search(body[:sniff_bytes])
+    if match:
+        charset = _normalize_charset(match.group(1).decode('ascii', 'ignore'))
+        if charset:
+            return charset
+    return 'utf-8'
+
+
+def decode_body(body: bytes, declared: Optional[str] = None, sniff_bytes: int = 4096) -> str:
+    return body.decode(sniff_charset(body, declared, sniff_bytes), errors='replace')
@@ -0,0 +1,150 @@
+"""
+robots.txt cache for ScrapAI
+Parsed rules are kept per origin with a TTL and an LRU size bound. The async
+cache fetches through the crawler's aiohttp session and shares one request
+between concurrent lookups for the same host.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+from backend.config import config
+from backend.scraper.response_body import read_body
+
+logger = logging.getLogger(__name__)
+
+# Larger files are truncated, as major crawlers do
+MAX_ROBOTS_BYTES = 500 * 1024
+
+
+class _UnavailableRules(RobotFileParser):
+    """Disallow-all rules standing in for a robots.txt that could not be fetched"""
+
+
+def robots_origin(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc.lower()}"
+
+
+def robots_rules(status: Optional[int], body: str = "") -> Tuple[RobotFileParser, float]:
+    """
+    Turn a robots.txt response into (rules, seconds to cache them)
+
+    2xx is parsed. Other 4xx mean there is no robots.txt, so everything is
+    allowed for the full TTL. 429, 5xx and network errors (status None) mean
+    the rules are unknown, so everything is disallowed for the short error
+    TTL and the host is retried after that; RobotsCache.retry_after tells
+    these apart from a real disallow.
+    """
+    if status is not None and 200 <= status < 300:
+        rules = RobotFileParser()
+        rules.parse(body.splitlines())
+        return rules, config.crawler.robots_ttl
+    if status is not None and 400 <= status < 500 and status != 429:
+        rules = RobotFileParser()
+        rules.allow_all = True
+        return rules, config.crawler.robots_ttl
+    rules = _UnavailableRules()
+    rules.disallow_all = True
+    return rules, config.crawler.robots_error_ttl
+
+
+class RobotsCache:
+    """LRU map of origin -> robots rules whose entries expire"""
+
+    def __init__(self, max_size: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size or config.crawler.robots_cache_size
+        self.clock = clock
+        self._entries: 'OrderedDict[str, Tuple[float, RobotFileParser]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, origin: str) -> Optional[RobotFileParser]:
+        entry = self._entries.get(origin)
+        if entry is None:
+            return None
+        expires_at, rules = entry
+        if expires_at <= self.clock():
+            del self._entries[origin]
+            return None
+        self._entries.move_to_end(origin)
+        return rules
+
+    def put(self, origin: str, rules: RobotFileParser, ttl: float) -> None:
+        self._entries[origin] = (self.clock() + ttl, rules)
+        self._entries.move_to_end(origin)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def retry_after(self, origin: str) -> Optional[float]:
+        """
+        Seconds until the rules for a host whose robots.txt could not be
+        fetched expire, or None if its rules are known (or not cached)
+        """
+        entry = self._entries.get(origin)
+        if entry is None or not isinstance(entry[1], _UnavailableRules):
+            return None
+        return max(entry[0] - self.clock(), 0.0)
+
+    @staticmethod
+    def crawl_delay(rules: RobotFileParser, user_agent: str) -> Optional[float]:
+        """Crawl-delay for the user agent, capped at config.crawler.max_crawl_delay"""
+        delay = rules.crawl_delay(user_agent)
+        if delay is None:
+            return None
+        return min(float(delay), config.crawler.max_crawl_delay)
+
+
+class AsyncRobotsCache(RobotsCache):
+    """RobotsCache that fetches missing or expired rules without blocking the event loop"""
+
+    def __init__(self, get_session: Callable[[], Awaitable[aiohttp.ClientSession]],
+                 user_agent: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.get_session = get_session
+        self.user_agent = user_agent or config.crawler.user_agent
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    async def rules_for(self, url: str) -> RobotFileParser:
+        origin = robots_origin(url)
+        rules = self.get(origin)
+        if rules is not None:
+            return rules
+
+        task = self._pending.get(origin)
+        if task is None:
+            task = asyncio.create_task(self._fetch(origin))
+            self._pending[origin] = task
+            task.add_done_callback(lambda _: self._pending.pop(origin, None))
+        # Shielded so one cancelled caller doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, origin: str) -> RobotFileParser:
+        status, body = None, ""
+        try:
+            session = await self.get_session()
+            timeout = aiohttp.ClientTimeout(total=config.crawler.robots_timeout)
+            async with session.get(f"{origin}/robots.txt", timeout=timeout) as response:
+                status = response.status
+                if 200 <= status < 300:
+                    data = await read_body(response, MAX_ROBOTS_BYTES, truncate=True)
+                    body = data.decode('utf-8', 'replace')
+        except Exception as e:
+            logger.warning(f"Error fetching {origin}/robots.txt: {e}")
+            status = None
+
+        rules, ttl = robots_rules(status, body)
+        self.put(origin, rules, ttl)
+        return rules
+
+    async def can_fetch(self, url: str) -> bool:
+        rules = await self.rules_for(url)
+        return rules.can_fetch(self.user_agent, url)
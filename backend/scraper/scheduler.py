@@ -0,0 +1,133 @@
+"""
+Priority- and politeness-aware crawl scheduler for ScrapAI
+Keeps a ready queue per host and only hands out URLs whose host may be fetched now
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from backend.config import config
+
+
+class PolitenessScheduler:
+    """
+    Serves queued URLs by priority without ever returning one that must wait
+
+    Every host has its own heap of pending items ordered by priority. Hosts
+    that are cooling down sit in a heap keyed on the time they may be fetched
+    again; hosts that are ready sit in a heap keyed on the priority of their
+    best item. A slow or rate-limited host therefore never blocks URLs from
+    other hosts behind it.
+    """
+
+    def __init__(self, default_delay: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.default_delay = config.crawler.request_delay if default_delay is None else default_delay
+        self.clock = clock
+        self._counter = itertools.count()
+        self._host_items: Dict[str, List[Tuple[int, int, Any]]] = {}
+        self._waiting: List[Tuple[float, int, str]] = []   # (next allowed time, seq, host)
+        self._ready: List[Tuple[int, int, str]] = []       # (-best priority, seq, host)
+        self._ready_priority: Dict[str, int] = {}
+        self._next_allowed: Dict[str, float] = {}
+        self._delays: Dict[str, float] = {}
+        self._size = 0
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def set_delay(self, host: str, delay: float) -> None:
+        """Override the delay between requests to one host (e.g. robots.txt Crawl-delay)"""
+        self._delays[host] = delay
+
+    def delay_for(self, host: str) -> float:
+        return self._delays.get(host, self.default_delay)
+
+    def put(self, item: Dict[str, Any]) -> None:
+        """Queue an item; it needs a 'url' and may carry a 'priority' (higher first)"""
+        host = self.host_of(item['url'])
+        priority = item.get('priority') or 0
+        items = self._host_items.get(host)
+        self._size += 1
+
+        if items is None:
+            self._host_items[host] = [(-priority, next(self._counter), item)]
+            heapq.heappush(self._waiting, (self._next_allowed.get(host, 0.0), next(self._counter), host))
+        else:
+            heapq.heappush(items, (-priority, next(self._counter), item))
+            if host in self._ready_priority and priority > self._ready_priority[host]:
+                # The older ready entry for this host becomes stale and is skipped
+                self._ready_priority[host] = priority
+                heapq.heappush(self._ready, (-priority, next(self._counter), host))
+        self._changed.set()
+
+    def _promote_ready_hosts(self, now: float) -> None:
+        while self._waiting and self._waiting[0][0] <= now:
+            _, _, host = heapq.heappop(self._waiting)
+            next_allowed = self._next_allowed.get(host, 0.0)
+            if next_allowed > now:
+                # reserve() pushed this host's slot back since it was queued
+                heapq.heappush(self._waiting, (next_allowed, next(self._counter), host))
+                continue
+            priority = -self._host_items[host][0][0]
+            self._ready_priority[host] = priority
+            heapq.heappush(self._ready, (-priority, next(self._counter), host))
+
+    def get_nowait(self) -> Optional[Dict[str, Any]]:
+        """Return the best item whose host may be fetched now, or None"""
+        now = self.clock()
+        self._promote_ready_hosts(now)
+
+        while self._ready:
+            neg_priority, _, host = heapq.heappop(self._ready)
+            if self._ready_priority.get(host) != -neg_priority:
+                continue  # stale entry
+            del self._ready_priority[host]
+
+            items = self._host_items[host]
+            _, _, item = heapq.heappop(items)
+            self._size -= 1
+
+            # Reserve the host's next slot at hand-out time
+            next_allowed = now + self.delay_for(host)
+            self._next_allowed[host] = next_allowed
+            if items:
+                heapq.heappush(self._waiting, (next_allowed, next(self._counter), host))
+            else:
+                del self._host_items[host]
+            return item
+        return None
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait until some host is ready and return its best item"""
+        while True:
+            item = self.get_nowait()
+            if item is not None:
+                return item
+
+            timeout = None
+            if self._waiting:
+                timeout = max(0.0, self._waiting[0][0] - self.clock())
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def reserve(self, host: str) -> None:
+        """Wait for and claim the next request slot for a host outside of get()"""
+        now = self.clock()
+        slot = max(now, self._next_allowed.get(host, 0.0))
+        # Claim the slot before sleeping so concurrent callers queue up behind it
+        self._next_allowed[host] = slot + self.delay_for(host)
+        if slot > now:
+            await asyncio.sleep(slot - now)
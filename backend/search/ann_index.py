@@ -0,0 +1,192 @@
+"""
+Approximate nearest neighbour search for ScrapAI
+An inverted-file (IVF) index: vectors are bucketed under their closest k-means
+centroid and a query only scans the posting lists of its nprobe closest centroids
+"""
+
+import logging
+import math
+import threading
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend.search.vector_index import VectorIndex, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 65536) -> np.ndarray:
+    """Index of the most similar centroid for each (normalised) row"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Cluster normalised vectors by cosine similarity and return unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_to_centroids(vectors, centroids)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        occupied = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[occupied]
+        sums[occupied] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        # Re-seed empty clusters from random points so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index with incremental inserts and an nprobe recall knob"""
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, min_train_size: int = 10000,
+                 train_iterations: int = 10, retrain_factor: float = 4.0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.train_iterations = train_iterations
+        self.retrain_factor = retrain_factor
+        self.dim: Optional[int] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[VectorIndex] = []
+        self._trained_size = 0
+        # Until there is enough data to train, vectors live in one flat list
+        self._flat = VectorIndex()
+        # Tombstoned chunk ids, skipped by search until purge drops their rows
+        self._deleted: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        if self._centroids is None:
+            return len(self._flat)
+        return max(sum(len(posting) for posting in self._lists) - len(self._deleted), 0)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def train(self, chunk_ids: Sequence[int], vectors: np.ndarray) -> None:
+        """Cluster the given vectors and rebuild all posting lists from them"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        nlist = self.nlist or max(1, int(4 * math.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        # k-means on a sample is close enough and keeps training time bounded
+        sample = vectors
+        max_sample = 256 * nlist
+        if len(vectors) > max_sample:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), max_sample, replace=False)]
+        centroids = spherical_kmeans(sample, nlist, self.train_iterations)
+
+        assignments = assign_to_centroids(vectors, centroids)
+        # Each list starts at its own size, so memory follows the data rather than nlist
+        lists = [
+            VectorIndex(dim=vectors.shape[1], initial_capacity=int(count))
+            for count in np.bincount(assignments, minlength=nlist)
+        ]
+        self._fill_lists(lists, assignments, chunk_ids, vectors)
+
+        with self._lock:
+            self.dim = vectors.shape[1]
+            self._centroids = centroids
+            self._lists = lists
+            self._trained_size = len(vectors)
+            self._flat = VectorIndex()
+        logger.info(f"Trained IVF index with {nlist} lists over {len(vectors)} vectors")
+
+    @staticmethod
+    def _fill_lists(lists: List[VectorIndex], assignments: np.ndarray,
+                    chunk_ids: np.ndarray, vectors: np.ndarray) -> None:
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(len(lists) + 1))
+        for list_id in range(len(lists)):
+            rows = order[bounds[list_id]:bounds[list_id + 1]]
+            if len(rows):
+                lists[list_id].add(chunk_ids[rows], vectors[rows])
+
+    def _all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        parts = [posting.snapshot() for posting in self._lists] + [self._flat.snapshot()]
+        parts = [(ids, vectors) for ids, vectors in parts if len(ids)]
+        return (np.concatenate([ids for ids, _ in parts]),
+                np.concatenate([vectors for _, vectors in parts]))
+
+    def delete(self, chunk_ids: Iterable[int]) -> None:
+        """Tombstone chunk ids; rows are dropped once tombstones reach a quarter of the index"""
+        if self._centroids is None:
+            self._flat.delete(chunk_ids)
+            return
+        with self._lock:
+            self._deleted.update(int(chunk_id) for chunk_id in chunk_ids)
+        if len(self._deleted) * 4 >= sum(len(posting) for posting in self._lists):
+            self.purge()
+
+    def purge(self, chunk_ids: Optional[Iterable[int]] = None) -> None:
+        """Drop the rows of chunk_ids (default: all tombstoned ones) from every posting list"""
+        with self._lock:
+            chunk_ids = set(self._deleted if chunk_ids is None else chunk_ids)
+            self._deleted -= chunk_ids
+            lists = self._lists
+        if chunk_ids:
+            for posting in lists:
+                posting.purge(chunk_ids)
+
+    def add(self, chunk_ids: Sequence[int], vectors) -> None:
+        """Insert vectors into their nearest lists, training or retraining when due"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if vectors.ndim != 2 or len(vectors) == 0:
+            return
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+
+        # A chunk id can come back after deletion; its old row must go first
+        readded = self._deleted.intersection(chunk_ids.tolist())
+        if readded:
+            self.purge(readded)
+
+        if self._centroids is None:
+            self._flat.add(chunk_ids, vectors)
+            if len(self._flat) >= self.min_train_size:
+                self.train(*self._flat.snapshot())
+            return
+
+        self._fill_lists(self._lists, assign_to_centroids(vectors, self._centroids), chunk_ids, vectors)
+        # Centroids drift as the corpus grows; re-cluster once it has grown enough
+        if len(self) >= self.retrain_factor * self._trained_size:
+            # Posting lists don't know the tombstones; drop those rows before re-clustering
+            self.purge()
+            self.train(*self._all_vectors())
+
+    def search(self, query_vector, k: int = 10, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return approximate top-k (chunk_id, cosine score) pairs, best first"""
+        with self._lock:
+            centroids, lists, flat = self._centroids, self._lists, self._flat
+            deleted = frozenset(self._deleted) if self._deleted else None
+        if centroids is None:
+            return flat.search(query_vector, k)
+
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        nprobe = max(1, min(nprobe or self.nprobe, len(centroids)))
+        probe = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+
+        # Over-fetch by the tombstone count so k live rows are still returned
+        fetch = k + (len(deleted) if deleted else 0)
+        hits = []
+        for list_id in probe:
+            hits.extend(lists[list_id].search(query, fetch))
+        if deleted:
+            hits = [hit for hit in hits if hit[0] not in deleted]
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
@@ -0,0 +1,56 @@
+"""
+Hybrid lexical + vector search for ScrapAI
+Runs the FTS5 keyword leg and the embedding leg concurrently and merges
+their rankings with weighted reciprocal rank fusion
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+
+from backend.config import config
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Dict[str, Any]]],
+                           weights: Optional[Sequence[float]] = None,
+                           k: int = 60, limit: int = 10, key: str = 'id') -> List[Dict[str, Any]]:
+    """
+    Merge ranked lists: score(d) = sum(weight / (k + rank of d in each list))
+
+    Only ranks are used, so the keyword (bm25) and vector (cosine) scores
+    never need to be put on a common scale.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    fused: Dict[Any, float] = {}
+    documents: Dict[Any, Dict[str, Any]] = {}
+
+    for weight, results in zip(weights, result_lists):
+        for rank, result in enumerate(results, start=1):
+            doc_id = result[key]
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+            if doc_id not in documents:
+                documents[doc_id] = dict(result)
+            elif result.get('snippet') and not documents[doc_id].get('snippet'):
+                documents[doc_id]['snippet'] = result['snippet']
+
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{**documents[doc_id], 'score': score} for doc_id, score in ranked]
+
+
+async def hybrid_search(client, engine, query: str, limit: int = 10,
+                        nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Search chunks by keyword and by vector in parallel and fuse the rankings"""
+    if not query or not query.strip():
+        return []
+
+    # Each leg goes deeper than the final limit so fusion has overlap to work with
+    candidates = max(limit, config.search.hybrid_candidates)
+    keyword_results, vector_results = await asyncio.gather(
+        client.search_chunks(query, candidates),
+        engine.search(query, candidates, nprobe)
+    )
+    return reciprocal_rank_fusion(
+        [keyword_results, vector_results],
+        weights=[config.search.hybrid_keyword_weight, config.search.hybrid_vector_weight],
+        k=config.search.hybrid_rrf_k,
+        limit=limit
+    )
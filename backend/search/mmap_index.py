@@ -0,0 +1,344 @@
+"""
+Memory-mapped on-disk vector index for ScrapAI
+The embedding worker appends immutable segments (a float32 matrix file plus a
+chunk-id sidecar) and compacts them in the background; API processes mmap the
+segments so every worker shares one page-cache copy of the vectors.
+
+Layout of the index directory:
+    manifest.json       dim, segment list, last embedding id covered and
+                        tombstones of deleted chunks
+    seg-000001.f32      rows x dim normalised float32 vectors
+    seg-000001.ids      rows int64 chunk ids
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.search.vector_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write a file so readers see either the old or the new contents"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    # Manifests written before deletions were tracked
+    manifest.setdefault('deleted', {})
+    manifest.setdefault('last_deletion_id', 0)
+    return manifest
+
+
+def _segment_seq(name: str) -> int:
+    return int(name.rsplit('-', 1)[1])
+
+
+def _dead_rows(chunk_ids: np.ndarray, seq: int, deleted: Dict[str, int]) -> np.ndarray:
+    """
+    Rows of segment seq whose chunk was deleted after the segment was written
+
+    A tombstone maps a chunk id to the next segment number at deletion time,
+    so it hides the chunk in older segments but not in a segment that holds
+    the chunk again after its id was reused.
+    """
+    dead = [int(chunk_id) for chunk_id, tomb_seq in deleted.items() if tomb_seq > seq]
+    if not dead:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.isin(chunk_ids, np.asarray(dead, dtype=np.int64)))
+
+
+class MmapVectorStore:
+    """Single-writer, append-only segment store"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.manifest = _read_manifest(directory) or {
+            'dim': None,
+            'segments': [],
+            'next_segment': 1,
+            'last_embedding_id': 0,
+            'deleted': {},
+            'last_deletion_id': 0
+        }
+
+    @property
+    def last_embedding_id(self) -> int:
+        return self.manifest['last_embedding_id']
+
+    @property
+    def last_deletion_id(self) -> int:
+        return self.manifest['last_deletion_id']
+
+    def _segment_path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{name}.{suffix}")
+
+    def _save_manifest(self) -> None:
+        _write_atomic(os.path.join(self.directory, MANIFEST), json.dumps(self.manifest).encode())
+
+    def _new_segment_name(self) -> str:
+        name = f"seg-{self.manifest['next_segment']:06d}"
+        self.manifest['next_segment'] += 1
+        return name
+
+    def append(self, chunk_ids: Sequence[int], vectors, last_embedding_id: Optional[int] = None) -> None:
+        """Write vectors as a new immutable segment and publish it in the manifest"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) == 0:
+            return
+        vectors = normalize_rows(vectors)
+
+        with self._lock:
+            if self.manifest['dim'] is None:
+                self.manifest['dim'] = int(vectors.shape[1])
+            elif vectors.shape[1] != self.manifest['dim']:
+                raise ValueError(f"Expected {self.manifest['dim']}-dim vectors, got {vectors.shape[1]}")
+
+            name = self._new_segment_name()
+            _write_atomic(self._segment_path(name, 'f32'), vectors.astype('<f4').tobytes())
+            _write_atomic(self._segment_path(name, 'ids'), np.asarray(chunk_ids, dtype='<i8').tobytes())
+
+            self.manifest['segments'].append({'name': name, 'rows': len(vectors)})
+            if last_embedding_id is not None:
+                self.manifest['last_embedding_id'] = last_embedding_id
+            self._save_manifest()
+
+    def delete(self, chunk_ids: Sequence[int], last_deletion_id: Optional[int] = None) -> None:
+        """Tombstone chunk ids in the segments written so far; compaction drops their rows"""
+        with self._lock:
+            seq = self.manifest['next_segment']
+            for chunk_id in chunk_ids:
+                self.manifest['deleted'][str(int(chunk_id))] = seq
+            if last_deletion_id is not None:
+                self.manifest['last_deletion_id'] = last_deletion_id
+            self._save_manifest()
+
+    @staticmethod
+    def _compaction_tail(segments: List[dict], size_ratio: float) -> List[dict]:
+        """
+        The newest segments worth merging: walking back from the newest, an
+        older segment joins only while it is at most size_ratio times the
+        rows gathered so far, so a large merged segment is rewritten only
+        once the small ones behind it have grown comparable to it
+        """
+        tail, rows = [], 0
+        for segment in reversed(segments):
+            if tail and segment['rows'] > size_ratio * rows:
+                break
+            tail.append(segment)
+            rows += segment['rows']
+        tail.reverse()
+        return tail
+
+    def compact(self, min_segments: int = 8, size_ratio: float = 4.0) -> bool:
+        """Merge the small newest segments into one once at least min_segments of them qualify"""
+        with self._lock:
+            segments = self._compaction_tail(self.manifest['segments'], size_ratio)
+            dim = self.manifest['dim']
+            if len(segments) < max(min_segments, 2):
+                return False
+            merged_name = self._new_segment_name()
+            deleted = dict(self.manifest['deleted'])
+            self._save_manifest()
+
+        # The merge itself runs without the lock so appends are not blocked.
+        # Deleted rows are left out; tombstones added meanwhile still apply
+        # to the merged segment, since it is numbered before them
+        keep = {}
+        for segment in segments:
+            ids = np.fromfile(self._segment_path(segment['name'], 'ids'), dtype='<i8')
+            keep[segment['name']] = np.delete(
+                np.arange(len(ids)), _dead_rows(ids, _segment_seq(segment['name']), deleted)
+            )
+        total_rows = sum(len(rows) for rows in keep.values())
+        if total_rows:
+            self._write_merged(merged_name, segments, keep, total_rows, dim)
+
+        with self._lock:
+            # The merged segment takes the place of the tail; older segments
+            # stay before it and ones appended during the merge after it
+            merged = {segment['name'] for segment in segments}
+            current = self.manifest['segments']
+            position = next(i for i, s in enumerate(current) if s['name'] in merged)
+            self.manifest['segments'] = (
+                current[:position]
+                + ([{'name': merged_name, 'rows': total_rows}] if total_rows else [])
+                + [s for s in current[position:] if s['name'] not in merged]
+            )
+            # A tombstone only applies to segments numbered before it; forget
+            # it once none of those is left
+            oldest = min((_segment_seq(s['name']) for s in self.manifest['segments']),
+                         default=self.manifest['next_segment'])
+            self.manifest['deleted'] = {
+                chunk_id: seq for chunk_id, seq in self.manifest['deleted'].items() if seq > oldest
+            }
+            self._save_manifest()
+
+        # Open mmaps in readers keep the unlinked files alive until they reload
+        for segment in segments:
+            for suffix in ('f32', 'ids'):
+                try:
+                    os.remove(self._segment_path(segment['name'], suffix))
+                except FileNotFoundError:
+                    pass
+
+        logger.info(f"Compacted {len(segments)} segments into {merged_name} ({total_rows} vectors)")
+        return True
+
+    def _write_merged(self, name: str, segments: List[dict], keep: Dict[str, np.ndarray],
+                      total_rows: int, dim: int) -> None:
+        """Write the kept rows of segments, in order, as segment name"""
+        vector_path = self._segment_path(name, 'f32')
+        ids_path = self._segment_path(name, 'ids')
+        merged_vectors = np.memmap(f"{vector_path}.tmp", dtype='<f4', mode='w+', shape=(total_rows, dim))
+        merged_ids = np.memmap(f"{ids_path}.tmp", dtype='<i8', mode='w+', shape=(total_rows,))
+        offset = 0
+        for segment in segments:
+            rows = segment['rows']
+            live = keep[segment['name']]
+            merged_vectors[offset:offset + len(live)] = np.fromfile(
+                self._segment_path(segment['name'], 'f32'), dtype='<f4').reshape(rows, dim)[live]
+            merged_ids[offset:offset + len(live)] = np.fromfile(
+                self._segment_path(segment['name'], 'ids'), dtype='<i8')[live]
+            offset += len(live)
+        merged_vectors.flush()
+        merged_ids.flush()
+        del merged_vectors, merged_ids
+        os.replace(f"{vector_path}.tmp", vector_path)
+        os.replace(f"{ids_path}.tmp", ids_path)
+
+    def start_background_compaction(self, interval: float = 60.0, min_segments: int = 8,
+                                    size_ratio: float = 4.0) -> None:
+        """Compact periodically on a daemon thread"""
+        if self._compaction_thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.compact(min_segments, size_ratio)
+                except Exception as e:
+                    logger.error(f"Vector index compaction failed: {e}")
+
+        self._compaction_thread = threading.Thread(target=run, name='vector-compaction', daemon=True)
+        self._compaction_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class MmapVectorReader:
+    """Read-only view over a MmapVectorStore directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.dim: Optional[int] = None
+        self._manifest_version = None
+        # (vectors, chunk ids, rows of deleted chunks) per segment
+        self._segments: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._maps: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._deleted: Dict[str, int] = {}
+        self._dead: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(ids) - len(dead) for _, ids, dead in self._segments)
+
+    def refresh(self) -> bool:
+        """Remap segments if the manifest changed; cheap enough to call per query"""
+        try:
+            stat = os.stat(os.path.join(self.directory, MANIFEST))
+        except FileNotFoundError:
+            return False
+        # The manifest is replaced atomically, so a new inode means a new version
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._manifest_version:
+            return False
+
+        with self._lock:
+            for _ in range(3):
+                manifest = _read_manifest(self.directory)
+                if manifest is None or manifest['dim'] is None:
+                    return False
+                try:
+                    maps = {}
+                    for segment in manifest['segments']:
+                        name, rows = segment['name'], segment['rows']
+                        maps[name] = self._maps.get(name) or (
+                            np.memmap(os.path.join(self.directory, f"{name}.f32"),
+                                      dtype='<f4', mode='r', shape=(rows, manifest['dim'])),
+                            np.memmap(os.path.join(self.directory, f"{name}.ids"),
+                                      dtype='<i8', mode='r', shape=(rows,))
+                        )
+                    break
+                except FileNotFoundError:
+                    # A compaction replaced segments between reading the manifest and mapping them
+                    continue
+            else:
+                return False
+
+            # Dead rows only change with the tombstones or for new segments
+            deleted = manifest['deleted']
+            dead = {} if deleted != self._deleted else self._dead
+            dead = {
+                name: dead[name] if name in dead else _dead_rows(ids, _segment_seq(name), deleted)
+                for name, (_, ids) in maps.items()
+            }
+
+            self.dim = manifest['dim']
+            self._maps = maps
+            self._deleted = deleted
+            self._dead = dead
+            self._segments = [
+                (*maps[segment['name']], dead[segment['name']]) for segment in manifest['segments']
+            ]
+            self._manifest_version = version
+        return True
+
+    def search(self, query_vector, k: int = 10) -> List[Tuple[int, float]]:
+        """Return the top-k (chunk_id, cosine score) pairs across all segments"""
+        segments = self._segments
+        if not segments or k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        candidate_ids, candidate_scores = [], []
+        for vectors, chunk_ids, dead in segments:
+            scores = vectors @ query
+            if len(dead):
+                # Deleted chunks can't reach the top k, so k live rows still come back
+                scores[dead] = -np.inf
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            candidate_ids.append(chunk_ids[top])
+            candidate_scores.append(scores[top])
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores)[:k]
+        return [(int(ids[i]), float(scores[i])) for i in order if scores[i] > -np.inf]
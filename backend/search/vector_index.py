@@ -0,0 +1,249 @@
+"""
+Vector similarity search for ScrapAI
+Keeps chunk embeddings in an in-memory NumPy matrix and answers cosine top-k queries
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend.config import config
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise each row so cosine similarity becomes a dot product"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """Growable float32 matrix of normalised embeddings keyed by chunk id"""
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024):
+        self.dim = dim
+        self.initial_capacity = initial_capacity
+        self._vectors: Optional[np.ndarray] = None
+        self._chunk_ids: Optional[np.ndarray] = None
+        self._size = 0
+        # Tombstoned chunk ids, skipped by search until purge drops their rows
+        self._deleted: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return max(self._size - len(self._deleted), 0)
+
+    def add(self, chunk_ids: Sequence[int], vectors) -> None:
+        """Append vectors; amortised O(1) per row thanks to capacity doubling"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) == 0:
+            return
+        if len(chunk_ids) != len(vectors):
+            raise ValueError("chunk_ids and vectors must have the same length")
+        vectors = normalize_rows(vectors)
+
+        # A chunk id can come back after deletion; its old row must go first
+        readded = self._deleted.intersection(int(chunk_id) for chunk_id in chunk_ids)
+        if readded:
+            self.purge(readded)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+            needed = self._size + len(vectors)
+            capacity = 0 if self._vectors is None else len(self._vectors)
+            if needed > capacity:
+                # Readers hold a reference to the old arrays, so grow by copying
+                # into fresh ones instead of resizing in place
+                new_capacity = max(needed, capacity * 2, self.initial_capacity)
+                grown_vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+                grown_ids = np.empty(new_capacity, dtype=np.int64)
+                if self._size:
+                    grown_vectors[:self._size] = self._vectors[:self._size]
+                    grown_ids[:self._size] = self._chunk_ids[:self._size]
+                self._vectors, self._chunk_ids = grown_vectors, grown_ids
+
+            self._vectors[self._size:needed] = vectors
+            self._chunk_ids[self._size:needed] = chunk_ids
+            self._size = needed
+
+    def delete(self, chunk_ids: Iterable[int]) -> None:
+        """Tombstone chunk ids; rows are dropped once tombstones reach a quarter of the index"""
+        with self._lock:
+            self._deleted.update(int(chunk_id) for chunk_id in chunk_ids)
+            due = len(self._deleted) * 4 >= self._size
+        if due:
+            self.purge()
+
+    def purge(self, chunk_ids: Optional[Iterable[int]] = None) -> None:
+        """Drop the rows of chunk_ids (default: all tombstoned ones) and forget their tombstones"""
+        with self._lock:
+            chunk_ids = set(self._deleted if chunk_ids is None else chunk_ids)
+            self._deleted -= chunk_ids
+            if not chunk_ids or self._size == 0:
+                return
+            keep = ~np.isin(self._chunk_ids[:self._size], np.fromiter(chunk_ids, dtype=np.int64))
+            # Fresh arrays, as in add, so readers keep a consistent view
+            self._vectors = self._vectors[:self._size][keep]
+            self._chunk_ids = self._chunk_ids[:self._size][keep]
+            self._size = len(self._chunk_ids)
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (chunk_ids, vectors) of the live rows added so far"""
+        with self._lock:
+            if self._size == 0:
+                return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+            chunk_ids, vectors = self._chunk_ids[:self._size], self._vectors[:self._size]
+            if self._deleted:
+                keep = ~np.isin(chunk_ids, np.fromiter(self._deleted, dtype=np.int64))
+                chunk_ids, vectors = chunk_ids[keep], vectors[keep]
+            return chunk_ids, vectors
+
+    def search(self, query_vector, k: int = 10) -> List[Tuple[int, float]]:
+        """Return the top-k (chunk_id, cosine score) pairs, best first"""
+        with self._lock:
+            vectors, chunk_ids, size = self._vectors, self._chunk_ids, self._size
+            deleted = frozenset(self._deleted) if self._deleted else None
+        if size == 0 or k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = vectors[:size] @ query
+        # Over-fetch by the tombstone count so k live rows are still returned
+        fetch = min(k + (len(deleted) if deleted else 0), size)
+        top = np.argpartition(-scores, fetch - 1)[:fetch]
+        top = top[np.argsort(-scores[top])]
+        hits = [(int(chunk_ids[i]), float(scores[i])) for i in top]
+        if deleted:
+            hits = [hit for hit in hits if hit[0] not in deleted]
+        return hits[:k]
+
+
+class SemanticSearchEngine:
+    """Embeds queries and ranks chunks against the embeddings table"""
+
+    def __init__(self, client, model_name: Optional[str] = None):
+        self.client = client
+        self.model_name = model_name or config.embedding.model
+        if config.search.vector_backend == "mmap":
+            # Shares the embedding worker's on-disk segments instead of loading rows
+            from backend.search.mmap_index import MmapVectorReader
+            self.index = MmapVectorReader(config.search.index_dir)
+        elif config.search.vector_backend == "ivf":
+            from backend.search.ann_index import IVFIndex
+            self.index = IVFIndex(
+                nlist=config.search.ivf_nlist,
+                nprobe=config.search.ivf_nprobe,
+                min_train_size=config.search.ivf_min_train_size
+            )
+        else:
+            self.index = VectorIndex()
+        self.last_embedding_id = 0
+        self.last_deletion_id = 0
+        self._last_refresh = 0.0
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._refresh_lock = asyncio.Lock()
+
+    def _get_model(self):
+        # Loaded lazily so the API starts without paying for the model
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def encode_query(self, query: str) -> np.ndarray:
+        return self._get_model().encode([query])[0]
+
+    async def refresh(self, force: bool = False) -> int:
+        """Pull embedding rows and chunk deletions since the last refresh into the index"""
+        if not force and time.monotonic() - self._last_refresh < config.search.refresh_interval:
+            return 0
+
+        if config.search.vector_backend == "mmap":
+            self.index.refresh()
+            self._last_refresh = time.monotonic()
+            return 0
+
+        added = 0
+        loop = asyncio.get_event_loop()
+        async with self._refresh_lock:
+            batch_size = config.search.refresh_batch_size
+            # Deletions first, so a chunk id reused after one stays visible
+            while True:
+                rows = await self.client.get_deleted_chunks_after(self.last_deletion_id, batch_size)
+                if not rows:
+                    break
+                await loop.run_in_executor(None, self.index.delete, [row['chunk_id'] for row in rows])
+                self.last_deletion_id = rows[-1]['id']
+                if len(rows) < batch_size:
+                    break
+            while True:
+                rows = await self.client.get_embeddings_after(self.last_embedding_id, batch_size)
+                if not rows:
+                    break
+                # Inserts may trigger IVF training, so keep them off the event loop
+                await loop.run_in_executor(
+                    None,
+                    self.index.add,
+                    [row['chunk_id'] for row in rows],
+                    [row['vector'] for row in rows]
+                )
+                self.last_embedding_id = rows[-1]['id']
+                added += len(rows)
+                if len(rows) < batch_size:
+                    break
+            self._last_refresh = time.monotonic()
+        return added
+
+    async def search(self, query: str, limit: int = 10, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the top chunks for a query with their page URL and score
+
+        nprobe trades recall for latency on the IVF backend and is ignored otherwise.
+        """
+        if not query or not query.strip():
+            return []
+
+        loop = asyncio.get_event_loop()
+        # Encode the query while new embedding rows are being loaded
+        query_future = loop.run_in_executor(None, self.encode_query, query)
+        await self.refresh()
+        query_vector = await query_future
+
+        search_args = (query_vector, limit)
+        if config.search.vector_backend == "ivf":
+            search_args += (nprobe,)
+        hits = await loop.run_in_executor(None, self.index.search, *search_args)
+        if not hits:
+            return []
+
+        chunks = await self.client.get_chunks_by_ids([chunk_id for chunk_id, _ in hits])
+        chunks_by_id = {chunk['id']: chunk for chunk in chunks}
+
+        results = []
+        for chunk_id, score in hits:
+            chunk = chunks_by_id.get(chunk_id)
+            if not chunk:
+                continue  # chunk deleted since it was indexed
+            results.append({
+                'id': chunk_id,
+                'page_id': chunk['page_id'],
+                'url': chunk['url'],
+                'title': chunk['title'],
+                'content': chunk['chunk_text'],
+                'score': score
+            })
+        return results
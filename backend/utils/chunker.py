@@ -3,16 +3,92 @@ Text chunking utility for ScrapAI
 Splits text into smaller chunks for embedding processing
 """
 
+import os
 import re
-from typing import List
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Iterator, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
 
+from backend.config import config
+
+# Sentence-ending punctuation and the whitespace after it
+_SENTENCE_BREAK = re.compile(r'([.!?])(\s+)')
+
+# A non-space character at the start of the string or after whitespace
+_WORD_START = re.compile(r'(?<!\S)\S')
+
 @dataclass
 class TextChunk:
     text: str
     index: int
     start_char: int
     end_char: int
+    # Model token ids without special tokens, set by TokenChunker
+    token_ids: Optional[List[int]] = None
+
+class ChunkSet:
+    """
+    The chunks of one text as int32 start/end offset arrays over the source
+
+    No text is copied per chunk: chunk text is sliced from the source when it
+    is asked for, and TextChunk objects are only built when iterating. Token
+    ids are kept once for the whole text, with each chunk's token range. A set
+    can drop its source (offsets_only) to travel between processes, and get it
+    back with with_source.
+    """
+
+    __slots__ = ('source', 'starts', 'ends', 'token_ids', 'token_starts', 'token_ends')
+
+    def __init__(self, source: Optional[str], starts: Optional[array] = None, ends: Optional[array] = None,
+                 token_ids: Optional[array] = None, token_starts: Optional[array] = None,
+                 token_ends: Optional[array] = None):
+        self.source = source
+        self.starts = starts if starts is not None else array('i')
+        self.ends = ends if ends is not None else array('i')
+        self.token_ids = token_ids
+        self.token_starts = token_starts
+        self.token_ends = token_ends
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> TextChunk:
+        if i < 0:
+            i += len(self)
+        return TextChunk(
+            text=self.text(i),
+            index=i,
+            start_char=self.starts[i],
+            end_char=self.ends[i],
+            token_ids=self.chunk_token_ids(i)
+        )
+
+    def __iter__(self) -> Iterator[TextChunk]:
+        return (self[i] for i in range(len(self)))
+
+    def text(self, i: int) -> str:
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def texts(self) -> List[str]:
+        source = self.source
+        return [source[start:end] for start, end in zip(self.starts, self.ends)]
+
+    def chunk_token_ids(self, i: int) -> Optional[List[int]]:
+        if self.token_ids is None:
+            return None
+        return self.token_ids[self.token_starts[i]:self.token_ends[i]].tolist()
+
+    def token_id_lists(self) -> List[Optional[List[int]]]:
+        return [self.chunk_token_ids(i) for i in range(len(self))]
+
+    def with_source(self, source: Optional[str]) -> 'ChunkSet':
+        """Same chunks over another copy of the source; the arrays are shared"""
+        return ChunkSet(source, self.starts, self.ends, self.token_ids, self.token_starts, self.token_ends)
+
+    def offsets_only(self) -> 'ChunkSet':
+        return self.with_source(None)
 
 class TextChunker:
     def __init__(self, chunk_size: int = 500, overlap: int = 50):
@@ -29,58 +105,53 @@ class TextChunker:
     def chunk_by_sentences(self, text: str) -> List[TextChunk]:
         """
         Chunk text by sentences, trying to keep chunks near target size
-        
+
+        Each chunk is a slice of the original text, so
+        chunk.text == text[start_char:end_char].
+
         Args:
             text: Input text to chunk
-            
+
         Returns:
             List of TextChunk objects
         """
+        return list(self.chunk_set(text))
+    
+    def chunk_set(self, text: str) -> ChunkSet:
+        """Sentence chunks of text as offsets, in a single pass over the sentence boundaries"""
+        chunks = ChunkSet(text)
         if not text or not text.strip():
-            return []
-        
-        # Split into sentences
-        sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-        
-        chunks = []
-        current_chunk = ""
-        current_start = 0
-        sentence_index = 0
-        
-        for i, sentence in enumerate(sentences):
+            return chunks
+
+        starts, ends = chunks.starts, chunks.ends
+        chunk_start = None
+        chunk_end = 0
+
+        for sentence_start, sentence_end in self._sentence_spans(text):
             # If adding this sentence would exceed chunk size and we have content
-            if len(current_chunk) + len(sentence) > self.chunk_size and current_chunk:
-                # Create chunk from current content
-                chunk_end = current_start + len(current_chunk)
-                chunks.append(TextChunk(
-                    text=current_chunk.strip(),
-                    index=len(chunks),
-                    start_char=current_start,
-                    end_char=chunk_end
-                ))
-                
-                # Start new chunk with overlap
-                overlap_text = self._get_overlap_text(current_chunk)
-                current_chunk = overlap_text + " " + sentence if overlap_text else sentence
-                current_start = chunk_end - len(overlap_text) if overlap_text else current_start + len(current_chunk)
-            else:
-                # Add sentence to current chunk
-                if not current_chunk:
-                    current_start = sum(len(s) + 1 for s in sentences[:i]) if i > 0 else 0
-                current_chunk += (" " if current_chunk else "") + sentence
-        
-        # Add final chunk if there's content
-        if current_chunk.strip():
-            chunk_end = current_start + len(current_chunk)
-            chunks.append(TextChunk(
-                text=current_chunk.strip(),
-                index=len(chunks),
-                start_char=current_start,
-                end_char=chunk_end
-            ))
-        
+            if chunk_start is not None and sentence_end - chunk_start > self.chunk_size:
+                starts.append(chunk_start)
+                ends.append(chunk_end)
+
+                # Start new chunk with overlap, or at this sentence if there is none
+                chunk_start = self._overlap_start(text, chunk_start, chunk_end)
+                if chunk_start is None:
+                    chunk_start = sentence_start
+            elif chunk_start is None:
+                chunk_start = sentence_start
+            chunk_end = sentence_end
+
+        # Add final chunk
+        if chunk_start is not None:
+            starts.append(chunk_start)
+            ends.append(chunk_end)
+
         return chunks
     
+    def chunk_documents(self, texts: Sequence[str]) -> List[ChunkSet]:
+        """Sentence-chunk each text; same interface as TokenChunker"""
+        return [self.chunk_set(text) for text in texts]
+    
     def chunk_by_fixed_size(self, text: str) -> List[TextChunk]:
         """
         Chunk text by fixed character size with overlap
@@ -126,11 +197,167 @@ class TextChunker:
         
         return chunks
     
-    def _get_overlap_text(self, text: str) -> str:
-        """Get overlap text from the end of a chunk"""
-        if len(text) <= self.overlap:
-            return text
-        return text[-self.overlap:].strip()
+    @staticmethod
+    def _sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+        """(start, end) of each sentence in text, ignoring leading and trailing whitespace"""
+        # Split into sentence bodies, their closing punctuation and the
+        # whitespace after it; running lengths of the pieces give every
+        # boundary offset without a Python-level loop
+        pieces = _SENTENCE_BREAK.split(text.strip())
+        bounds = list(accumulate(map(len, pieces), initial=len(text) - len(text.lstrip())))
+        return zip(bounds[0::3], bounds[2::3] + [bounds[-1]])
+
+    def _overlap_start(self, text: str, start: int, end: int) -> Optional[int]:
+        """Offset of the first word starting in the last `overlap` characters of text[start:end]"""
+        if self.overlap <= 0:
+            return None
+        match = _WORD_START.search(text, max(start, end - self.overlap), end)
+        return match.start() if match else None
+
+
+def load_tokenizer(model_name: str):
+    """Fast (Rust) tokenizer of a sentence-transformers model"""
+    from transformers import AutoTokenizer
+
+    # sentence-transformers resolves bare model names under its own organisation
+    if '/' not in model_name and not os.path.isdir(model_name):
+        model_name = f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    if not tokenizer.is_fast:
+        raise ValueError(f"No fast tokenizer available for {model_name}")
+    return tokenizer
+
+def special_token_affixes(tokenizer) -> Tuple[List[int], List[int]]:
+    """Special token ids the tokenizer puts before and after a single sequence, e.g. [CLS] and [SEP]"""
+    plain = tokenizer('a', add_special_tokens=False)['input_ids']
+    full = tokenizer('a')['input_ids']
+    for i in range(len(full) - len(plain) + 1):
+        if full[i:i + len(plain)] == plain:
+            return full[:i], full[i + len(plain):]
+    raise ValueError("Could not locate the special tokens added by the tokenizer")
+
+class TokenChunker:
+    """
+    Packs whole sentences into chunks of at most max_tokens model tokens
+
+    Token counts come from the embedding model's tokenizer, one batched call
+    per list of documents, and chunk text is cut at token offsets so
+    chunk.text == text[start_char:end_char]. Each chunk keeps the token ids
+    it was sized with, so the embedding worker doesn't tokenize it again.
+    A sentence longer than the budget is split between tokens.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int = 256, overlap: int = 32):
+        """
+        Args:
+            tokenizer: Fast tokenizer of the embedding model (see load_tokenizer)
+            max_tokens: Model sequence limit, including special tokens
+            overlap: Number of tokens to overlap between chunks
+        """
+        self.tokenizer = tokenizer
+        # Leave room for [CLS] and [SEP]
+        prefix, suffix = special_token_affixes(tokenizer)
+        self.budget = max_tokens - len(prefix) - len(suffix)
+        if self.budget <= 0:
+            raise ValueError(f"max_tokens={max_tokens} leaves no room for content")
+        # Every chunk must add at least half a budget of new tokens
+        self.overlap = max(0, min(overlap, self.budget // 2))
+
+    def chunk_documents(self, texts: Sequence[str]) -> List[ChunkSet]:
+        """Chunk several texts with a single tokenizer call"""
+        if not texts:
+            return []
+        encodings = self.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )
+        return [
+            self._pack(text, token_ids, offsets)
+            for text, token_ids, offsets in zip(texts, encodings['input_ids'], encodings['offset_mapping'])
+        ]
+
+    def chunk_by_tokens(self, text: str) -> List[TextChunk]:
+        return list(self.chunk_documents([text])[0])
+
+    def _pack(self, text: str, token_ids: List[int], offsets: List[Tuple[int, int]]) -> ChunkSet:
+        chunks = ChunkSet(text, token_ids=array('i', token_ids), token_starts=array('i'), token_ends=array('i'))
+        if not token_ids or not text.strip():
+            return chunks
+
+        # Token index at which each sentence ends
+        token_starts = [start for start, _ in offsets]
+        boundaries = []
+        lo = 0
+        for _, sentence_end in TextChunker._sentence_spans(text):
+            lo = bisect_left(token_starts, sentence_end, lo)
+            boundaries.append(lo)
+        boundaries[-1] = len(token_ids)
+
+        # Current chunk is tokens [start, end); tokens before fresh are overlap
+        start = end = fresh = 0
+        for boundary in boundaries:
+            while boundary - start > self.budget:
+                if end > start:
+                    cut = end
+                elif start < fresh:
+                    # Drop the overlap rather than split a sentence that fits alone
+                    start = end = fresh
+                    continue
+                else:
+                    cut = start + self.budget
+                self._add_chunk(chunks, offsets, start, cut)
+                start = end = self._overlap_start(offsets, start, cut)
+                fresh = cut
+            end = boundary
+
+        if end > start:
+            self._add_chunk(chunks, offsets, start, end)
+        return chunks
+
+    def _overlap_start(self, offsets: List[Tuple[int, int]], start: int, end: int) -> int:
+        """First token of the overlap carried over from tokens [start, end), not inside a word"""
+        i = max(start, end - self.overlap)
+        while start < i < end and offsets[i][0] == offsets[i - 1][1]:
+            i += 1
+        return i
+
+    @staticmethod
+    def _add_chunk(chunks: ChunkSet, offsets: List[Tuple[int, int]], start: int, end: int) -> None:
+        chunks.starts.append(offsets[start][0])
+        chunks.ends.append(offsets[end - 1][1])
+        chunks.token_starts.append(start)
+        chunks.token_ends.append(end)
+
+def make_chunker():
+    """TextChunker or TokenChunker, as selected by config.chunking.mode"""
+    if config.chunking.mode == "tokens":
+        # Same tokenizer as the embedding model, so the stored ids can be fed to it
+        return TokenChunker(
+            load_tokenizer(config.embedding.model),
+            max_tokens=config.chunking.max_tokens,
+            overlap=config.chunking.token_overlap
+        )
+    return TextChunker(chunk_size=config.chunking.chunk_size, overlap=config.chunking.overlap)
+
+_process_chunker = None
+
+def chunk_documents_in_process(texts: Sequence[str]) -> List[ChunkSet]:
+    """
+    Process-pool entry point: chunk texts with a chunker built once per process
+
+    Only the offsets (and token ids) are sent back; the caller already has
+    the texts and re-attaches them with ChunkSet.with_source.
+    """
+    global _process_chunker
+    if _process_chunker is None:
+        # The pool already uses every core; keep the Rust tokenizer single-threaded
+        os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+        _process_chunker = make_chunker()
+    return [chunks.offsets_only() for chunks in _process_chunker.chunk_documents(texts)]
 
 # Convenience functions
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50, method: str = "sentences") -> List[str]:
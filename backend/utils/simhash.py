@@ -0,0 +1,70 @@
+"""
+SimHash fingerprints for ScrapAI
+Near-duplicate pages (syndicated copies, boilerplate pages differing by a
+timestamp) get fingerprints a few bits apart, and a banded index finds them
+with exact-match lookups
+"""
+
+import hashlib
+import re
+from typing import List, Optional
+
+import numpy as np
+
+FINGERPRINT_BITS = 64
+
+# 4 bands of 16 bits: by pigeonhole, fingerprints at most 3 bits apart
+# agree exactly on at least one band
+NUM_BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // NUM_BANDS
+MAX_INDEXED_DISTANCE = NUM_BANDS - 1
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    words = re.findall(r'\w+', text.lower())
+    count = max(len(words) - shingle_size + 1, 0)
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(' '.join(words[i:i + shingle_size]).encode(), digest_size=8).digest(), 'little')
+            for i in range(count)
+        ),
+        dtype='<u8',
+        count=count
+    )
+
+
+def simhash(text: str, shingle_size: int = 3, min_words: int = 0) -> Optional[int]:
+    """
+    64-bit SimHash over word shingles, or None for text with fewer than
+    min_words words (short texts give unreliable fingerprints)
+    """
+    if not text or len(text.split()) < max(min_words, shingle_size):
+        return None
+
+    hashes = _shingle_hashes(text, shingle_size)
+    if not len(hashes):
+        return None
+
+    # One row of 64 bits per shingle; each bit position votes by majority
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, FINGERPRINT_BITS)
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return int(np.packbits(majority).view('<u8')[0])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def fingerprint_bands(fingerprint: int) -> List[int]:
+    """Split a fingerprint into NUM_BANDS integers of BAND_BITS bits"""
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (band * BAND_BITS)) & mask for band in range(NUM_BANDS)]
+
+
+def to_signed64(fingerprint: int) -> int:
+    """Unsigned fingerprint -> signed value that fits a BIGINT / SQLite INTEGER column"""
+    return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+
+def from_signed64(value: int) -> int:
+    return value & ((1 << 64) - 1)
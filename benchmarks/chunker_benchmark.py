@@ -0,0 +1,121 @@
+"""
+Sentence chunker benchmark for ScrapAI
+Times TextChunker.chunk_by_sentences on synthetic documents from a few KB to
+several MB, checks that every chunk is the exact slice its offsets point at,
+and compares against the previous implementation. Also times chunk_set,
+which returns offset arrays instead of TextChunk objects, and compares the
+memory each representation holds besides the document itself
+
+Run from the repository root: python -m benchmarks.chunker_benchmark
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from typing import List
+
+from backend.utils.chunker import ChunkSet, TextChunk, TextChunker
+
+WORDS = (
+    "search crawler index vector page content latency throughput queue worker "
+    "semantic embedding chunk token document ranking query result cache shard "
+    "replica network request response parser extract benchmark python async"
+).split()
+
+
+def make_document(size: int, seed: int = 42) -> str:
+    """Paragraphs of sentences of varying length until the text reaches size characters"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 30))).capitalize()
+        sentence += rng.choice('..!?') + rng.choice((' ', ' ', ' ', '\n', '\n\n'))
+        parts.append(sentence)
+        length += len(sentence)
+    return ''.join(parts)[:size]
+
+
+def legacy_chunk_by_sentences(text: str, chunk_size: int, overlap: int) -> List[TextChunk]:
+    """chunk_by_sentences as it was before the single-pass rewrite, for comparison"""
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    chunks = []
+    current_chunk = ""
+    current_start = 0
+    for i, sentence in enumerate(sentences):
+        if len(current_chunk) + len(sentence) > chunk_size and current_chunk:
+            chunk_end = current_start + len(current_chunk)
+            chunks.append(TextChunk(current_chunk.strip(), len(chunks), current_start, chunk_end))
+            overlap_text = current_chunk if len(current_chunk) <= overlap else current_chunk[-overlap:].strip()
+            current_chunk = overlap_text + " " + sentence if overlap_text else sentence
+            current_start = chunk_end - len(overlap_text) if overlap_text else current_start + len(current_chunk)
+        else:
+            if not current_chunk:
+                current_start = sum(len(s) + 1 for s in sentences[:i]) if i > 0 else 0
+            current_chunk += (" " if current_chunk else "") + sentence
+    if current_chunk.strip():
+        chunks.append(TextChunk(current_chunk.strip(), len(chunks), current_start, current_start + len(current_chunk)))
+    return chunks
+
+
+def chunk_list_bytes(chunks: List[TextChunk]) -> int:
+    """Memory held by a list of TextChunks: the list, the objects and their copied text"""
+    return sys.getsizeof(chunks) + sum(
+        sys.getsizeof(chunk) + sys.getsizeof(chunk.__dict__) + sys.getsizeof(chunk.text) for chunk in chunks
+    )
+
+
+def chunk_set_bytes(chunks: ChunkSet) -> int:
+    """Memory held by a ChunkSet besides the shared source string"""
+    return sys.getsizeof(chunks) + sys.getsizeof(chunks.starts) + sys.getsizeof(chunks.ends)
+
+
+def best_time(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sentence chunker")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 300_000, 1_000_000, 5_000_000])
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--overlap', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    chunker = TextChunker(chunk_size=args.chunk_size, overlap=args.overlap)
+
+    for size in args.sizes:
+        document = make_document(size)
+        chunks = chunker.chunk_by_sentences(document)
+        exact = all(chunk.text == document[chunk.start_char:chunk.end_char] for chunk in chunks)
+
+        elapsed = best_time(lambda: chunker.chunk_by_sentences(document), args.repeat)
+        line = (
+            f"{size / 1e6:6.2f} MB: {len(chunks):6d} chunks  {elapsed * 1000:9.1f} ms  "
+            f"{size / 1e6 / elapsed:7.1f} MB/s  exact offsets: {'yes' if exact else 'NO'}"
+        )
+        legacy_chunks = legacy_chunk_by_sentences(document, args.chunk_size, args.overlap)
+        legacy_exact = all(chunk.text == document[chunk.start_char:chunk.end_char] for chunk in legacy_chunks)
+        legacy = best_time(lambda: legacy_chunk_by_sentences(document, args.chunk_size, args.overlap), args.repeat)
+        print(
+            f"{line}  |  previous: {legacy * 1000:9.1f} ms ({legacy / elapsed:.1f}x)  "
+            f"exact offsets: {'yes' if legacy_exact else 'NO'}"
+        )
+
+        chunk_set = chunker.chunk_set(document)
+        offsets_elapsed = best_time(lambda: chunker.chunk_set(document), args.repeat)
+        print(
+            f"{'':>10}chunk_set: {offsets_elapsed * 1000:9.1f} ms  "
+            f"{chunk_set_bytes(chunk_set) / 1024:8.1f} KB vs {chunk_list_bytes(chunks) / 1024:8.1f} KB as TextChunks"
+        )
+
+
+if __name__ == "__main__":
+    main()
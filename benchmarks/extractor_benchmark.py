@@ -0,0 +1,114 @@
+"""
+Extraction backend benchmark for ScrapAI
+Builds a synthetic corpus of news, blog, docs and sidebar-heavy pages, then
+reports pages/sec for each installed extractor and how often its output
+matches the BeautifulSoup reference
+
+Run from the repository root: python -m benchmarks.extractor_benchmark
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from backend.scraper.extractors import available_extractors, get_extractor
+
+WORDS = (
+    "search crawler index vector page content latency throughput queue worker "
+    "semantic embedding chunk token document ranking query result cache shard "
+    "replica network request response parser extract benchmark python async"
+).split()
+
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def paragraphs(rng: random.Random, count: int) -> str:
+    return '\n'.join(
+        f"<p>{sentence(rng)} <a href='/p/{rng.randint(1, 999)}'>{sentence(rng, 4)}</a> "
+        f"<b>{sentence(rng, 6)}</b> &amp; {sentence(rng)}</p>"
+        for _ in range(count)
+    )
+
+
+def chrome(rng: random.Random) -> str:
+    """Navigation, scripts and other markup every extractor should strip"""
+    links = ''.join(f"<li><a href='/{word}'>{word.title()} section link</a></li>" for word in rng.sample(WORDS, 8))
+    return (
+        f"<header><nav><ul>{links}</ul></nav></header>"
+        f"<script>var config = {{'id': {rng.randint(1, 10**6)}}}; window.track(config);</script>"
+        f"<style>.content {{ margin: 0 auto; }}</style>"
+        f"<!-- generated {rng.random()} -->"
+    )
+
+
+def make_page(rng: random.Random, index: int) -> str:
+    kind = index % 4
+    title = sentence(rng, 6)
+    head = (
+        f"<head><meta charset='utf-8'><title>{title}</title>"
+        f"<meta name='description' content='{sentence(rng, 18)}'></head>"
+    )
+    size = rng.choice((5, 20, 60, 200))
+
+    if kind == 0:
+        body = f"{chrome(rng)}<article><h1>{title}</h1>{paragraphs(rng, size)}</article><footer>{sentence(rng)}</footer>"
+    elif kind == 1:
+        body = (
+            f"{chrome(rng)}<div class='wrapper'><div class='post-content'>{paragraphs(rng, size)}"
+            f"<form><input name='q'><button>Search the whole site now</button></form></div></div>"
+        )
+    elif kind == 2:
+        body = f"{chrome(rng)}<main><section>{paragraphs(rng, size)}</section></main><aside>{paragraphs(rng, 3)}</aside>"
+    else:
+        # No content container: extractors fall back to <body> minus sidebar noise
+        body = (
+            f"{chrome(rng)}<div class='sidebar'>{paragraphs(rng, 4)}</div>"
+            f"<div class='comments'>{paragraphs(rng, 6)}</div><div>{paragraphs(rng, size)}</div>"
+        )
+    return f"<!DOCTYPE html><html>{head}<body>{body}</body></html>"
+
+
+# Degenerate bodies every backend must handle without raising
+BLANK_PAGES = ['', ' \n\t ', '<!-- nothing here -->']
+
+
+def build_corpus(pages: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    return [make_page(rng, i) for i in range(pages)] + BLANK_PAGES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML extraction backends")
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.pages)
+    megabytes = sum(len(page) for page in corpus) / 1e6
+    print(f"Corpus: {len(corpus)} pages, {megabytes:.1f} MB")
+
+    reference = [get_extractor('bs4').extract(page, 'http://example.com') for page in corpus]
+
+    for name in available_extractors():
+        extractor = get_extractor(name)
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = [extractor.extract(page, 'http://example.com') for page in corpus]
+            best = min(best, time.perf_counter() - start)
+
+        matches = sum(
+            result['content_hash'] == expected['content_hash']
+            for result, expected in zip(results, reference)
+        )
+        print(
+            f"{name:>11}: {len(corpus) / best:8.1f} pages/sec  {megabytes / best:6.1f} MB/s  "
+            f"identical to bs4: {matches}/{len(corpus)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
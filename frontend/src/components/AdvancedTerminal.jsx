@@ -118,7 +118,7 @@ export default function AdvancedTerminal() {
                         const ms = (performance.now() - start).toFixed(1);
                         if (res.ok) {
                             const data = await res.json();
-                            addLog(`Target injected successfully in ${ms}ms. Queue length: ${data.queued}`, "exe");
+                            addLog(`Target injected successfully in ${ms}ms. Added: ${data.added} [DUPLICATES: ${data.duplicates}] [INVALID: ${data.invalid}]`, "exe");
                         } else {
                             addLog(`API REJECTED injected payload. Status: ${res.status}`, "err");
                         }
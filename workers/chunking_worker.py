@@ -1,71 +1,221 @@
 """
 Chunking Worker for ScrapAI
 Processes stored pages and creates text chunks for embedding
+
+With --backlog, pages are fanned out to a process pool and their chunks are
+written back in bulk, draining a large backlog on every core
 """
 
+import argparse
 import asyncio
 import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from backend.database.client import DatabaseClient
-from backend.utils.chunker import TextChunker
+from backend.utils.chunker import ChunkSet, chunk_documents_in_process, make_chunker
 from backend.config import config
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ChunkingWorker:
-    def __init__(self):
+    def __init__(self, backlog: bool = False):
         self.db = DatabaseClient()
-        self.chunker = TextChunker(
-            chunk_size=getattr(config.chunking, 'chunk_size', 500),
-            overlap=getattr(config.chunking, 'overlap', 50)
-        )
+        self.backlog = backlog
+        self.chunker = None
+        self.pool = None
+        if backlog:
+            self.workers = config.chunking.workers or os.cpu_count() or 1
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        else:
+            self.chunker = make_chunker()
+        self.pages_chunked = 0
+        self.chunks_created = 0
     
     async def process_chunks(self):
-        """Process pages that need chunking"""
+        """
+        Process pages that need chunking
+        
+        Pages are read in id order behind a cursor, so pages that yield no
+        chunks are passed over instead of being fetched again. At the end of
+        the table the cursor goes back to the start straight away if the pass
+        wrote anything, and otherwise after an idle wait that doubles up to
+        max_idle_interval.
+        """
+        after_id = 0
+        pass_chunks = 0
+        idle_interval = config.chunking.idle_poll_interval
         while True:
             try:
                 # Get pages that have content but no chunks
-                pages = await self.db.get_pages_needing_chunking(limit=config.chunking.batch_size)
+                pages = await self.db.get_pages_needing_chunking(
+                    limit=config.chunking.batch_size, after_id=after_id
+                )
                 
                 if not pages:
+                    after_id = 0
+                    if pass_chunks:
+                        pass_chunks = 0
+                        idle_interval = config.chunking.idle_poll_interval
+                        continue
                     logger.info("No pages needing chunking, waiting...")
-                    await asyncio.sleep(30)
+                    await asyncio.sleep(idle_interval)
+                    idle_interval = min(idle_interval * 2, config.chunking.max_idle_interval)
                     continue
                 
+                after_id = pages[-1]['id']
                 total_chunks = 0
-                for page in pages:
+                pages = [page for page in pages if page.get('content')]
+                # Token mode tokenizes the whole batch in one call
+                page_chunks = self.chunker.chunk_documents([page['content'] for page in pages])
+                for page, chunks in zip(pages, page_chunks):
+                    if not chunks:
+                        continue
                     try:
-                        if not page.get('content'):
+                        # Save all chunks of the page in one transaction
+                        saved = await self.db.save_chunks_for_pages([self.chunk_rows(page, chunks)])
+                        if not saved:
+                            logger.error(f"Failed to save {len(chunks)} chunks for page {page['id']}")
                             continue
-                            
-                        # Create chunks from page content
-                        chunks = self.chunker.chunk_by_sentences(page['content'])
-                        
-                        # Save each chunk to database
-                        for i, chunk in enumerate(chunks):
-                            chunk_id = await self.db.save_chunk(
-                                page_id=page['id'],
-                                chunk_text=chunk.text,
-                                chunk_index=i
-                            )
-                            if chunk_id:
-                                total_chunks += 1
+                        total_chunks += saved
                         
-                        logger.info(f"Created {len(chunks)} chunks for page {page['id']}: {page['url']}")
+                        logger.info(f"Created {saved} chunks for page {page['id']}: {page['url']}")
                         
                     except Exception as e:
                         logger.error(f"Error processing page {page.get('id')}: {e}")
                         continue
                 
+                pass_chunks += total_chunks
                 logger.info(f"Created {total_chunks} total chunks from {len(pages)} pages")
                 
-                # Wait before next batch
-                await asyncio.sleep(10)
-                
             except Exception as e:
                 logger.error(f"Chunking worker error: {str(e)}")
                 await asyncio.sleep(30)
+    
+    @staticmethod
+    def chunk_rows(page: dict, chunks: ChunkSet) -> dict:
+        """save_chunks_for_pages item for a page's chunks"""
+        return {
+            'page_id': page['id'],
+            'starts': chunks.starts,
+            'ends': chunks.ends,
+            # Offsets-only storage leaves the text in pages.content
+            'chunks': chunks.with_source(page['content']).texts() if config.chunking.store_text else None,
+            'token_ids': chunks.token_id_lists() if chunks.token_ids is not None else None
+        }
+    
+    async def chunk_and_save(self, pages: list) -> int:
+        """Chunk a group of pages in the pool and write all their chunks in one transaction"""
+        loop = asyncio.get_running_loop()
+        # Only offsets come back from the pool, not copies of the text
+        page_chunks = await loop.run_in_executor(
+            self.pool, chunk_documents_in_process, [page['content'] for page in pages]
+        )
+        saved = await self.db.save_chunks_for_pages([
+            self.chunk_rows(page, chunks) for page, chunks in zip(pages, page_chunks)
+        ])
+        if not saved and any(page_chunks):
+            raise RuntimeError(f"Failed to save chunks for pages {pages[0]['id']}-{pages[-1]['id']}")
+        self.pages_chunked += sum(1 for chunks in page_chunks if chunks)
+        self.chunks_created += saved
+        return saved
+    
+    async def report_stats(self):
+        """Log throughput every stats_interval seconds"""
+        last_pages, last_chunks, last_time = 0, 0, time.monotonic()
+        while True:
+            await asyncio.sleep(config.chunking.stats_interval)
+            now = time.monotonic()
+            elapsed = now - last_time
+            if self.pages_chunked != last_pages:
+                logger.info(
+                    f"{(self.pages_chunked - last_pages) / elapsed:.1f} pages/sec, "
+                    f"{(self.chunks_created - last_chunks) / elapsed:.1f} chunks/sec; "
+                    f"{self.pages_chunked} pages, {self.chunks_created} chunks so far"
+                )
+            last_pages, last_chunks, last_time = self.pages_chunked, self.chunks_created, now
+    
+    async def process_backlog(self):
+        """
+        Drain pages needing chunking through the process pool
+        
+        Pages are read in id order behind a cursor, so batches can be fetched
+        while earlier ones are still being chunked. At the end of the table
+        the cursor goes back to the start straight away if the pass wrote
+        anything, and otherwise after an idle wait that doubles up to
+        max_idle_interval.
+        """
+        logger.info(f"Chunking backlog with {self.workers} processes")
+        stats = asyncio.create_task(self.report_stats())
+        # Keep every process busy with one group queued behind it
+        max_in_flight = self.workers * 2
+        in_flight = set()
+        after_id = 0
+        pass_chunks = self.chunks_created
+        idle_interval = config.chunking.idle_poll_interval
+        try:
+            while True:
+                try:
+                    pages = await self.db.get_pages_needing_chunking(
+                        limit=config.chunking.backlog_batch_size, after_id=after_id
+                    )
+                except Exception as e:
+                    logger.error(f"Error fetching pages to chunk: {e}")
+                    await asyncio.sleep(idle_interval)
+                    continue
+                
+                if pages:
+                    after_id = pages[-1]['id']
+                    step = config.chunking.pages_per_task
+                    for i in range(0, len(pages), step):
+                        while len(in_flight) >= max_in_flight:
+                            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                            self._log_failures(done)
+                        in_flight.add(asyncio.create_task(self.chunk_and_save(pages[i:i + step])))
+                    continue
+                
+                # End of the table: let the last groups land before rescanning
+                if in_flight:
+                    done, in_flight = await asyncio.wait(in_flight)
+                    self._log_failures(done)
+                after_id = 0
+                if self.chunks_created > pass_chunks:
+                    pass_chunks = self.chunks_created
+                    idle_interval = config.chunking.idle_poll_interval
+                    continue
+                
+                await asyncio.sleep(idle_interval)
+                idle_interval = min(idle_interval * 2, config.chunking.max_idle_interval)
+        finally:
+            stats.cancel()
+            for task in in_flight:
+                task.cancel()
+            self.pool.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def _log_failures(done):
+        for task in done:
+            if task.exception() is not None:
+                logger.error(f"Error chunking pages: {task.exception()}")
+    
+    async def run(self):
+        try:
+            if self.backlog:
+                await self.process_backlog()
+            else:
+                await self.process_chunks()
+        finally:
+            await self.db.close()
 
 if __name__ == "__main__":
-    worker = ChunkingWorker()
-    asyncio.run(worker.process_chunks())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chunk stored pages for embedding")
+    parser.add_argument('--backlog', action='store_true',
+                        help="chunk on every core and write in bulk, for catching up on many pages")
+    args = parser.parse_args()
+    worker = ChunkingWorker(backlog=args.backlog)
+    asyncio.run(worker.run())
@@ -1,112 +1,234 @@
-import requests
+"""
+Crawler Worker for ScrapAI
+Drains the crawl queue through LightweightCrawler with concurrent fetches
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
 import time
-import hashlib
-from bs4 import BeautifulSoup
-import re
+from collections import defaultdict
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from backend.database.client import DatabaseClient
+from backend.scraper.frontier import Frontier
+from backend.scraper.lightweight_crawler import FetchResult, LightweightCrawler, parse_page
+from backend.scraper.scheduler import PolitenessScheduler
+from backend.config import config
 
-API_URL = "https://scrapai-2.onrender.com"
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-class SimpleCrawler:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (compatible; ScrapAI-Bot/1.0)',
-        })
-    
-    def fetch_page(self, url):
-        try:
-            response = self.session.get(url, timeout=10)
-            return response.text
-        except Exception as e:
-            print(f"Error fetching {url}: {e}")
-            return ""
-    
-    def extract_content(self, html, url):
-        if not html:
-            return {'title': '', 'content': '', 'hash': ''}
-        
+class CrawlerWorker:
+    def __init__(self, concurrency: int = None):
+        self.db = DatabaseClient()
+        self.scheduler = PolitenessScheduler()
+        self.crawler = LightweightCrawler(scheduler=self.scheduler)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency or config.crawler.max_concurrent
+        self.host_slots = defaultdict(lambda: asyncio.Semaphore(config.crawler.per_host_concurrency))
+        # Parsing runs in separate processes so large pages don't stall in-flight fetches
+        self.parse_workers = config.crawler.parse_workers or os.cpu_count() or 1
+        self.parse_pool = ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        # Bounded hand-off between the stages: fetchers wait when parsers fall behind
+        self.parse_queue = asyncio.Queue(maxsize=config.crawler.parse_queue_size)
+        self.frontier = Frontier(self.db)
+        # Queue ids claimed by this worker and not yet marked processed
+        self.held = set()
+        self.pages_processed = 0
+        self.status_counts = defaultdict(int)
+
+    async def claim_work(self):
+        """Keep the scheduler stocked with claimed queue items"""
+        while True:
+            try:
+                # Claim only what the fetchers can start on before the leases run out
+                if len(self.scheduler) >= self.concurrency * 2:
+                    await asyncio.sleep(0.5)
+                    continue
+
+                items = await self.db.claim_batch(
+                    config.crawler.claim_batch_size, self.worker_id, config.crawler.lease_seconds
+                )
+                if not items:
+                    await asyncio.sleep(config.crawler.idle_poll_interval)
+                    continue
+
+                for item in items:
+                    self.held.add(item['id'])
+                    self.scheduler.put(item)
+            except Exception as e:
+                logger.error(f"Error claiming work: {e}")
+                await asyncio.sleep(config.crawler.idle_poll_interval)
+
+    async def renew_leases(self):
+        """Extend leases on held items so slow hosts don't get them reclaimed"""
+        while True:
+            await asyncio.sleep(config.crawler.lease_seconds / 3)
+            try:
+                await self.db.renew_lease(list(self.held), self.worker_id, config.crawler.lease_seconds)
+            except Exception as e:
+                logger.error(f"Error renewing leases: {e}")
+
+    async def fetch_loop(self):
+        """One of N concurrent fetchers feeding the parse stage"""
+        while True:
+            item = await self.scheduler.get()
+            host = PolitenessScheduler.host_of(item['url'])
+            async with self.host_slots[host]:
+                fetched = await self.fetch_item(item)
+            if fetched:
+                # Blocks while the parse queue is full, which pauses this fetcher
+                await self.parse_queue.put((item, *fetched))
+
+    async def fetch_item(self, item: dict) -> Optional[Tuple[FetchResult, Optional[dict]]]:
+        """
+        Fetch one queue item, finishing it here if there is nothing to parse
+
+        URLs crawled before are fetched conditionally; a 304 or a body
+        identical to the stored one is recorded as 'unchanged' without parsing.
+        """
+        url = item['url']
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Remove scripts
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get title
-            title = soup.find('title')
-            title_text = title.text.strip() if title else url
-            
-            # Get body content
-            body = soup.find('body')
-            text = body.get_text() if body else ""
-            
-            # Clean text
-            text = re.sub(r'\s+', ' ', text)
-            lines = [line.strip() for line in text.split('.') if len(line.strip()) > 10]
-            clean_text = '. '.join(lines)
-            
-            return {
-                'title': title_text,
-                'content': clean_text,
-                'hash': hashlib.sha256(clean_text.encode()).hexdigest() if clean_text else ''
-            }
+            if not await self.crawler.can_fetch(url):
+                retry_after = self.crawler.robots_retry_after(url)
+                if retry_after is not None:
+                    # robots.txt failed to load; that is not a rule against this URL
+                    await self.defer_item(item, retry_after)
+                else:
+                    await self.finish_item(item, 'blocked')
+                return None
+
+            page = await self.db.get_page_validators(url)
+            result = await self.crawler.fetch(
+                url,
+                etag=page['etag'] if page else None,
+                last_modified=page['last_modified'] if page else None,
+                wait_politely=False
+            )
+            if page and (result.not_modified or result.body_hash == page['body_hash']):
+                await self.db.mark_page_unchanged(page['id'], result.etag, result.last_modified)
+                await self.finish_item(item, 'unchanged')
+                return None
+
+            if not result.html:
+                await self.finish_item(item, 'skipped' if result.skipped else 'failed')
+                return None
+            return result, page
         except Exception as e:
-            print(f"Error extracting content: {e}")
-            return {'title': '', 'content': '', 'hash': ''}
-
-def process_queue():
-    print("🕷️ Crawler worker started...")
-    crawler = SimpleCrawler()
-    
-    while True:
+            logger.error(f"Error fetching {url}: {e}")
+            await self.finish_item(item, 'failed')
+            return None
+
+    async def parse_loop(self):
+        """Extract content in the process pool, then de-duplicate and store it"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item, result, page = await self.parse_queue.get()
+            status = 'failed'
+            try:
+                content = await loop.run_in_executor(self.parse_pool, parse_page, result.html, item['url'])
+                status = await self.store_page(item, result, content, page)
+                if status == 'completed' and config.crawler.follow_links:
+                    await self.frontier.add_links(content.get('links', []), item['url'], item.get('depth', 0) + 1)
+            except Exception as e:
+                logger.error(f"Error processing {item['url']}: {e}")
+            finally:
+                await self.finish_item(item, status)
+                self.parse_queue.task_done()
+
+    async def store_page(self, item: dict, result: FetchResult, content: dict, page: Optional[dict]) -> str:
+        """Save extracted content unless it is empty or duplicates another page"""
+        if not content.get('content'):
+            return 'failed'
+
+        # A re-crawled page is always saved so its validators are refreshed
+        if page is None and await self.db.is_duplicate(content['content_hash']):
+            return 'duplicate'
+
+        # Dropped here so near-copies are never chunked or embedded
+        if await self.db.find_near_duplicate(content.get('simhash'), page['id'] if page else None):
+            return 'near_duplicate'
+
+        page_id = await self.db.save_page({
+            'url': item['url'],
+            'title': content['title'],
+            'content': content['content'],
+            'hash': content['content_hash'],
+            'simhash': content.get('simhash'),
+            'etag': result.etag,
+            'last_modified': result.last_modified,
+            'body_hash': result.body_hash
+        })
+        return 'completed' if page_id else 'failed'
+
+    async def finish_item(self, item: dict, status: str):
+        await self.db.mark_queue_processed(item['id'], status, self.worker_id)
+        self.held.discard(item['id'])
+        self.pages_processed += 1
+        self.status_counts[status] += 1
+
+    async def defer_item(self, item: dict, delay: float):
+        """Give an item back to the queue to be claimed again after delay seconds"""
+        await self.db.defer_queue_item(item['id'], delay, self.worker_id)
+        self.held.discard(item['id'])
+        self.status_counts['deferred'] += 1
+
+    async def persist_frontier(self):
+        """Periodically write the seen-URL filter so a restart doesn't re-discover everything"""
+        while True:
+            await asyncio.sleep(config.crawler.frontier_save_interval)
+            try:
+                await asyncio.to_thread(self.frontier.save)
+            except Exception as e:
+                logger.error(f"Error saving frontier: {e}")
+
+    async def report_stats(self):
+        """Log throughput every stats_interval seconds"""
+        last_count, last_time = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(config.crawler.stats_interval)
+            now = time.monotonic()
+            rate = (self.pages_processed - last_count) / (now - last_time)
+            last_count, last_time = self.pages_processed, now
+            logger.info(
+                f"{rate:.2f} pages/sec, {self.pages_processed} processed "
+                f"({dict(self.status_counts)}), {len(self.scheduler)} scheduled, "
+                f"{self.parse_queue.qsize()} waiting to parse, {len(self.frontier.seen)} URLs seen"
+            )
+
+    async def run(self):
+        """Run the claimer, lease renewer, frontier saver, stats reporter, N fetchers and the parsers"""
+        logger.info(
+            f"Crawler worker {self.worker_id} started with {self.concurrency} fetchers "
+            f"and {self.parse_workers} parser processes"
+        )
+        warmed = await self.frontier.warm()
+        if warmed:
+            logger.info(f"Seeded the frontier with {warmed} queued URLs")
+        tasks = [
+            asyncio.create_task(self.claim_work()),
+            asyncio.create_task(self.renew_leases()),
+            asyncio.create_task(self.persist_frontier()),
+            asyncio.create_task(self.report_stats()),
+        ]
+        tasks += [asyncio.create_task(self.fetch_loop()) for _ in range(self.concurrency)]
+        tasks += [asyncio.create_task(self.parse_loop()) for _ in range(self.parse_workers)]
         try:
-            # Get stats to see if there are URLs to process
-            stats_response = requests.get(f"{API_URL}/api/v1/stats")
-            stats = stats_response.json()
-            
-            print(f"📊 Current stats: {stats}")
-            
-            # For now, let's test with a hardcoded URL
-            test_urls = [
-                "https://httpbin.org/html",
-                "https://example.com",
-                "https://httpbin.org/json"
-            ]
-            
-            for url in test_urls:
-                print(f"🔗 Testing crawl: {url}")
-                
-                html = crawler.fetch_page(url)
-                if html:
-                    content = crawler.extract_content(html, url)
-                    
-                    if content['content']:
-                        # Add the page directly using your API
-                        page_data = {
-                            'url': url,
-                            'title': content['title'],
-                            'content': content['content'],
-                            'hash': content['hash']
-                        }
-                        
-                        # Try to add via API
-                        try:
-                            response = requests.post(f"{API_URL}/api/v1/crawl", 
-                                                   json={"urls": [url]})
-                            print(f"✅ Queued: {url} - {response.status_code}")
-                            
-                            # Also add the page content directly for testing
-                            add_response = requests.post(f"{API_URL}/api/v1/add-test-page")
-                            print(f"✅ Added test page: {add_response.status_code}")
-                            
-                        except Exception as e:
-                            print(f"❌ API Error: {e}")
-            
-            time.sleep(30)  # Wait 30 seconds between checks
-                
-        except Exception as e:
-            print(f"❌ Worker error: {e}")
-            time.sleep(30)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.crawler.close()
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+            self.frontier.save()
+            await self.db.close()
 
 if __name__ == "__main__":
-    process_queue()
+    worker = CrawlerWorker()
+    asyncio.run(worker.run())
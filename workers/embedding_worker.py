@@ -1,6 +1,12 @@
 import asyncio
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
+from sentence_transformers.util import batch_to_device
 from backend.database.client import DatabaseClient
+from backend.utils.chunker import special_token_affixes
 from backend.config import config
 import logging
 
@@ -10,41 +16,282 @@ logger = logging.getLogger(__name__)
 class EmbeddingWorker:
     def __init__(self):
         self.db = DatabaseClient()
-        self.model = SentenceTransformer(config.embedding.model)
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = SentenceTransformer(config.embedding.model, device=str(self.device))
+        self.model.to(self.device)
+        self.model.eval()
+        self.token_prefix, self.token_suffix = special_token_affixes(self.model.tokenizer)
+        # Padded length (batch size x longest chunk) that encodes in about
+        # target_batch_seconds, per kind of batch, measured as batches run
+        self.batch_budget = {}
+        # Padded length of the smallest batch that failed, per kind; budgets stay below it
+        self.budget_limit = {}
+        # Chunks that fail to encode on their own are not fetched again
+        self.failed_chunks = set()
+        self.chunks_embedded = 0
+        # Rows written since the last segment append, and when that was
+        self.unsynced_rows = 0
+        self.last_sync = time.monotonic()
+        self.fetched = None
+        self.encoded = None
+        self.vector_store = None
+        if config.search.vector_backend == "mmap":
+            from backend.search.mmap_index import MmapVectorStore
+            self.vector_store = MmapVectorStore(config.search.index_dir)
+            self.vector_store.start_background_compaction(
+                interval=config.search.compact_interval,
+                min_segments=config.search.compact_min_segments,
+                size_ratio=config.search.compact_size_ratio
+            )
         
-    async def process_embeddings(self):
-        """Process chunks that need embeddings"""
+    async def sync_vector_store(self):
+        """Tombstone deleted chunks and append embedding rows not yet in the on-disk index"""
+        if self.vector_store is None:
+            return
+        self.unsynced_rows = 0
+        self.last_sync = time.monotonic()
+        # Deletions first, so a chunk id reused after one stays visible
+        while True:
+            rows = await self.db.get_deleted_chunks_after(
+                self.vector_store.last_deletion_id, config.search.refresh_batch_size
+            )
+            if not rows:
+                break
+            await asyncio.to_thread(
+                self.vector_store.delete, [row['chunk_id'] for row in rows], rows[-1]['id']
+            )
         while True:
+            rows = await self.db.get_embeddings_after(
+                self.vector_store.last_embedding_id, config.search.refresh_batch_size
+            )
+            if not rows:
+                break
+            await asyncio.to_thread(
+                self.vector_store.append,
+                [row['chunk_id'] for row in rows],
+                [row['vector'] for row in rows],
+                rows[-1]['id']
+            )
+            logger.info(f"Appended {len(rows)} vectors to the on-disk index")
+        
+    def encode_token_ids(self, token_ids: List[List[int]], batch_size: Optional[int] = None) -> np.ndarray:
+        """Embed chunks from the token ids TokenChunker stored, skipping the tokenizer"""
+        tokenizer = self.model.tokenizer
+        limit = self.model.max_seq_length - len(self.token_prefix) - len(self.token_suffix)
+        batch_size = batch_size or config.embedding.batch_size
+        embeddings = []
+        for i in range(0, len(token_ids), batch_size):
+            features = tokenizer.pad(
+                {'input_ids': [
+                    self.token_prefix + list(ids[:limit]) + self.token_suffix
+                    for ids in token_ids[i:i + batch_size]
+                ]},
+                padding=True,
+                return_tensors='pt'
+            )
+            with torch.no_grad():
+                output = self.model(batch_to_device(features, self.device))
+            embeddings.append(output['sentence_embedding'].cpu().numpy())
+        return np.concatenate(embeddings)
+        
+    def chunk_length(self, chunk: dict) -> int:
+        """Padded length a chunk costs: tokens for token-mode chunks, characters otherwise"""
+        if chunk.get('token_ids'):
+            return min(len(chunk['token_ids']), self.model.max_seq_length)
+        return len(chunk['chunk_text'])
+        
+    def plan_batches(self, chunks: List[dict]) -> List[Tuple[str, List[dict]]]:
+        """
+        Cut fetched chunks into length-bucketed batches
+        
+        Chunks are sorted by length so each batch pads to about its own
+        length, and a batch grows until batch size times its longest chunk
+        reaches the budget measured for a target_batch_seconds forward pass.
+        """
+        batches = []
+        kinds = (
+            ('tokens', [chunk for chunk in chunks if chunk.get('token_ids')]),
+            ('text', [chunk for chunk in chunks if not chunk.get('token_ids')])
+        )
+        for kind, group in kinds:
+            group.sort(key=self.chunk_length)
+            budget = self.batch_budget.get(kind)
+            batch = []
+            for chunk in group:
+                size = len(batch) + 1
+                if batch and (
+                    size > config.embedding.max_batch_size
+                    or (budget is None and size > config.embedding.batch_size)
+                    or (budget is not None and size > config.embedding.min_batch_size
+                        and size * self.chunk_length(chunk) > budget)
+                ):
+                    batches.append((kind, batch))
+                    batch = []
+                batch.append(chunk)
+            if batch:
+                batches.append((kind, batch))
+        return batches
+        
+    def encode_batch(self, kind: str, batch: List[dict]) -> np.ndarray:
+        """Run one forward pass over a batch; called in a worker thread"""
+        if kind == 'tokens':
+            return self.encode_token_ids([chunk['token_ids'] for chunk in batch], batch_size=len(batch))
+        return self.model.encode(
+            [chunk['chunk_text'] for chunk in batch],
+            batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False
+        )
+        
+    def update_budget(self, kind: str, batch: List[dict], elapsed: float):
+        """Resize the padded-length budget of a kind of batch towards the latency target"""
+        padded = len(batch) * max(self.chunk_length(chunk) for chunk in batch)
+        budget = padded * config.embedding.target_batch_seconds / max(elapsed, 1e-3)
+        previous = self.batch_budget.get(kind)
+        # Smooth out one-off slow batches
+        budget = budget if previous is None else 0.7 * previous + 0.3 * budget
+        self.batch_budget[kind] = min(budget, self.budget_limit.get(kind, budget))
+        
+    def shrink_budget(self, kind: str, batch: List[dict]):
+        """Keep batches of a kind below the padded length of one that failed, e.g. out of memory"""
+        padded = len(batch) * max(self.chunk_length(chunk) for chunk in batch)
+        self.budget_limit[kind] = min(padded / 2, self.budget_limit.get(kind, padded))
+        self.batch_budget[kind] = min(self.batch_budget.get(kind, padded), self.budget_limit[kind])
+        
+    async def fetch_chunks(self):
+        """
+        Prefetch stage: read chunks needing embeddings behind an id cursor
+        
+        At the end of the table it waits for queued chunks to be written, then
+        rescans straight away if the pass embedded anything and otherwise after
+        an idle wait that doubles up to max_idle_interval.
+        """
+        after_id = 0
+        pass_embedded = self.chunks_embedded
+        idle_interval = config.embedding.idle_poll_interval
+        while True:
+            try:
+                chunks = await self.db.get_chunks_without_embeddings(
+                    limit=config.embedding.prefetch_size, after_id=after_id
+                )
+            except Exception as e:
+                logger.error(f"Error fetching chunks to embed: {e}")
+                await asyncio.sleep(idle_interval)
+                continue
+            
+            if chunks:
+                after_id = chunks[-1]['id']
+                chunks = [
+                    chunk for chunk in chunks
+                    if chunk['chunk_text'] and chunk['id'] not in self.failed_chunks
+                ]
+                if chunks:
+                    await self.fetched.put(chunks)
+                continue
+            
+            # Chunks behind the cursor may still be queued; rescanning before
+            # they are written would embed them twice
+            await self.fetched.join()
+            await self.encoded.join()
+            # Publish pending rows and deletions before going idle
+            await self.sync_vector_store()
+            after_id = 0
+            if self.chunks_embedded > pass_embedded:
+                pass_embedded = self.chunks_embedded
+                idle_interval = config.embedding.idle_poll_interval
+                continue
+            
+            logger.info("No chunks needing embeddings, waiting...")
+            await asyncio.sleep(idle_interval)
+            idle_interval = min(idle_interval * 2, config.embedding.max_idle_interval)
+    
+    async def encode_chunks(self):
+        """Encode stage: run batches in a worker thread so the event loop keeps fetching and writing"""
+        while True:
+            chunks = await self.fetched.get()
+            try:
+                for kind, batch in self.plan_batches(chunks):
+                    await self.encode_or_split(kind, batch)
+            except Exception as e:
+                logger.error(f"Error encoding chunks: {e}")
+            finally:
+                self.fetched.task_done()
+    
+    async def encode_or_split(self, kind: str, batch: List[dict]) -> int:
+        """
+        Encode a batch and queue it for writing, returning how many chunks were skipped
+        
+        A batch that fails is retried in halves, so only the chunks that fail
+        on their own are skipped and the rest of the batch is still embedded.
+        """
+        try:
+            started = time.monotonic()
+            embeddings = await asyncio.to_thread(self.encode_batch, kind, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Skipping chunk {batch[0]['id']}, it failed to encode: {e}")
+                self.failed_chunks.add(batch[0]['id'])
+                return 1
+            logger.warning(f"Batch of {len(batch)} chunks failed to encode, retrying in halves: {e}")
+            half = len(batch) // 2
+            skipped = await self.encode_or_split(kind, batch[:half])
+            skipped += await self.encode_or_split(kind, batch[half:])
+            if not skipped:
+                # Every chunk encodes in a smaller batch, so the size was the problem
+                self.shrink_budget(kind, batch)
+            return skipped
+        self.update_budget(kind, batch, time.monotonic() - started)
+        await self.encoded.put([(chunk['id'], embedding) for chunk, embedding in zip(batch, embeddings)])
+        return 0
+    
+    async def write_embeddings(self):
+        """Write stage: store each batch in one transaction and extend the on-disk index"""
+        while True:
+            pairs = await self.encoded.get()
             try:
-                # Get chunks without embeddings
-                chunks = await self.db.get_chunks_without_embeddings(limit=config.embedding.batch_size)
-                
-                if not chunks:
-                    logger.info("No chunks needing embeddings, waiting...")
-                    await asyncio.sleep(30)
-                    continue
-                    
-                # Generate embeddings
-                texts = [chunk['chunk_text'] for chunk in chunks if chunk['chunk_text']]
-                if texts:
-                    embeddings = self.model.encode(texts).tolist()
-                    
-                    # Store embeddings in database
-                    for i, chunk in enumerate(chunks):
-                        if i < len(embeddings):
-                            await self.db.save_embedding(chunk['id'], embeddings[i])
-                    
-                    # Mark chunks as processed
-                    for chunk in chunks:
-                        await self.db.mark_chunk_embedded(chunk['id'])
-                        
-                    logger.info(f"Generated embeddings for {len(chunks)} chunks")
-                    
-                await asyncio.sleep(10)
-                
+                if await self.db.save_embeddings_bulk(pairs):
+                    self.chunks_embedded += len(pairs)
+                    self.unsynced_rows += len(pairs)
+                    # Several batches go into one segment, so compaction has less to merge
+                    if (self.unsynced_rows >= config.search.append_min_rows
+                            or time.monotonic() - self.last_sync >= config.search.append_interval):
+                        await self.sync_vector_store()
+                else:
+                    logger.error(f"Failed to save embeddings for {len(pairs)} chunks")
             except Exception as e:
-                logger.error(f"Embedding worker error: {str(e)}")
-                await asyncio.sleep(30)
+                logger.error(f"Error writing embeddings: {e}")
+            finally:
+                self.encoded.task_done()
+    
+    async def report_stats(self):
+        """Log throughput every stats_interval seconds"""
+        last_chunks, last_time = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(config.embedding.stats_interval)
+            now = time.monotonic()
+            if self.chunks_embedded != last_chunks:
+                budgets = ', '.join(f"{kind} {budget:.0f}" for kind, budget in self.batch_budget.items())
+                logger.info(
+                    f"{(self.chunks_embedded - last_chunks) / (now - last_time):.1f} chunks/sec; "
+                    f"{self.chunks_embedded} chunks so far; batch budgets: {budgets or 'untimed'}"
+                )
+            last_chunks, last_time = self.chunks_embedded, now
+    
+    async def process_embeddings(self):
+        """Embed chunks through a prefetch, encode and write pipeline"""
+        # Backfill anything embedded before the index existed
+        await self.sync_vector_store()
+        # One batch prefetched ahead of the encoder, a couple of encoded batches waiting to be written
+        self.fetched = asyncio.Queue(maxsize=1)
+        self.encoded = asyncio.Queue(maxsize=2)
+        stages = [
+            asyncio.create_task(stage())
+            for stage in (self.fetch_chunks, self.encode_chunks, self.write_embeddings, self.report_stats)
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await self.db.close()
 
 if __name__ == "__main__":
     worker = EmbeddingWorker()